@@ -1,35 +1,158 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, send_file
-import sqlite3
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify, has_request_context, make_response, session, abort
 import os
+import uuid
+import hmac
+
+import db
+import metrics
+
+from conflicts import parse_meeting, parse_days, day_names, meetings_overlap, row_meeting, first_conflict
+import solver
+from catalog import get_catalog, catalog_version, page_sections, page_catalog, PAGE_SIZE, PAGE_FILTERS, CHILD_TYPES
+import calendar_grid
+from cache import LRUCache
+import search
+from schedule_batch import validate_batch
+from compatibility import compatibility_check
+from suggestions import suggest_swaps
+from gradestore import grade_store_stale, has_grade_store, list_grade_files, get_grade_stats
+import user_schedules
+import schedule_export
+import jobs
+import dataimport
 
 app = Flask(__name__)
+# Signs the session cookie that carries each visitor's schedule id. Set it in the
+# environment when running more than one process, or sessions won't survive a restart.
+app.secret_key = os.environ.get('COURSE_SCHEDULER_SECRET_KEY')
+if not app.secret_key:
+    # Fine for the debug server (run as a script, or with FLASK_DEBUG); anywhere
+    # else every worker would sign with a different key and drop sessions
+    if not (app.debug or __name__ == '__main__'):
+        app.logger.error(
+            "COURSE_SCHEDULER_SECRET_KEY is not set; sessions are signed with a random "
+            "per-process key and won't survive a restart or move between workers."
+        )
+    app.secret_key = os.urandom(32)
+
+# Admin routes require this in X-Admin-Token; they are disabled while it's unset
+ADMIN_TOKEN = os.environ.get('COURSE_SCHEDULER_ADMIN_TOKEN')
+
+# Helper function to restrict admin routes to holders of the admin token
+def require_admin():
+    token = request.headers.get('X-Admin-Token')
+    if not ADMIN_TOKEN or not token or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        abort(403)
+
+# Opt-in request metrics on /metrics, registered before the other request hooks
+if metrics.enabled():
+    metrics.init_app(app, profile=metrics.profiling_enabled(), authorize=require_admin)
 
 DATABASE = 'courses.db'
 
+# Rendered calendar pages keyed by their ETag
+calendar_cache = LRUCache()
+
+# Databases whose schedule tables have been created or migrated by this process
+migrated_databases = set()
+
 # Helper function to connect to the database
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row  # Allows dictionary-like access to rows
-    return conn
+def get_db_connection(readonly=None):
+    """Lease a pooled connection for this request.
+
+    Routes that only read pass readonly=True; otherwise GET routes get a
+    read-only connection and other methods lease the single writer.
+    """
+    if readonly is None:
+        readonly = has_request_context() and request.method in ('GET', 'HEAD')
+    return metrics.instrument(db.get_connection(DATABASE, readonly=readonly))
+
+# Return the request's pooled connections even if a route raised before closing them
+app.teardown_appcontext(db.release_request_connections)
+
+@app.before_request
+def prepare_schedule_tables():
+    """Create or migrate the catalog, the per-user schedule tables and the search index on the first request."""
+    if DATABASE not in migrated_databases:
+        conn = get_db_connection(readonly=False)
+        # A catalog imported before timeStatus and LectureChildTypes existed
+        dataimport.upgrade_catalog(conn, DATABASE)
+        user_schedules.ensure_schema(conn)
+        # Indexes built before search rows were keyed by section id
+        if not search.search_index_current(conn):
+            search.rebuild_search_index(conn)
+        conn.commit()
+        migrated_databases.add(DATABASE)
+
+# Helper function to identify the visitor whose schedule this is
+def current_user_id():
+    user_id = session.get('userID')
+    if user_id is None:
+        user_id = session['userID'] = uuid.uuid4().hex
+        session.permanent = True
+    return user_id
+
+# Helper function to load the visitor's cached schedule
+def current_schedule(conn, catalog=None):
+    return user_schedules.get_user_schedule(conn, catalog or get_catalog(conn), current_user_id())
+
+# Helper function to read the term dates for calendar exports
+def export_term():
+    start = schedule_export.term_start(request.args.get('start'))
+    weeks = request.args.get('weeks', schedule_export.DEFAULT_WEEKS, type=int)
+    if start is None or not 1 <= weeks <= schedule_export.MAX_WEEKS:
+        return None, None
+    return start, weeks
+
+# Helper function to send an export as a streamed download
+def export_response(chunks, fmt, filename):
+    mimetype = 'text/calendar' if fmt == 'ics' else 'text/csv'
+    return Response(chunks, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}.{fmt}"',
+        'Cache-Control': 'no-store',
+    })
+
+# Helper functions for keyset-paginated listings
+def page_filters():
+    return {column: request.args.get(column, '').strip() for column in PAGE_FILTERS}
+
+def page_after():
+    after_code, after_id = request.args.get('after_code'), request.args.get('after_id')
+    return (after_code, after_id) if after_code is not None and after_id is not None else None
+
+def next_page_url(endpoint, next_after):
+    if next_after is None:
+        return None
+    args = request.args.to_dict()
+    args.update(after_code=next_after[0], after_id=next_after[1])
+    return url_for(endpoint, **args)
+
+# Search results are ranked, so they page by offset rather than by keyset
+def next_offset_url(endpoint, next_offset):
+    if next_offset is None:
+        return None
+    args = request.args.to_dict()
+    args.update(offset=next_offset)
+    return url_for(endpoint, **args)
+
+def render_create_schedule(conn, **context):
+    """Render the create-schedule form with one page of the course dropdown."""
+    courses, next_after = page_sections(
+        conn, after=page_after(), limit=request.args.get('limit', PAGE_SIZE, type=int), **page_filters()
+    )
+    return render_template(
+        'create_schedule.html',
+        title='Create Schedule',
+        courses=courses,
+        next_url=next_page_url('create_schedule', next_after),
+        **context
+    )
 
 # Helper function to check for time conflicts
 def has_time_conflict(time1, days1, time2, days2):
     """Check if two courses overlap in time and days"""
-    if time1 == "TBA" or time2 == "TBA":
-        return False  # Skip conflict check for TBA courses
-
-    # Check if the days overlap
-    for day in days1:
-        if day in days2:
-            # Parse start and end times
-            start1, end1 = map(lambda t: int(t.replace(":", "")), time1.split("-"))
-            start2, end2 = map(lambda t: int(t.replace(":", "")), time2.split("-"))
-            
-            # Check for overlap
-            if not (end1 <= start2 or end2 <= start1):
-                return True
-
-    return False
+    # TBA or malformed times parse to None and never conflict
+    return meetings_overlap(parse_meeting(time1, days1), parse_meeting(time2, days2))
 
 @app.route('/')
 def home():
@@ -40,21 +163,59 @@ def home():
 def courses():
     """View and search courses."""
     query = request.args.get('query', '').strip()
+    fits = request.args.get('fits') == '1'
+    filters = page_filters()
+    limit = request.args.get('limit', PAGE_SIZE, type=int)
     conn = get_db_connection()
     try:
+        next_after = None
+        next_url = None
         if query:
-            courses = conn.execute('''
-                SELECT * FROM Courses
-                WHERE courseCode LIKE ? OR courseName LIKE ?
-            ''', (f'%{query}%', f'%{query}%')).fetchall()
-        else:
-            courses = conn.execute('SELECT * FROM Courses').fetchall()
+            courses, next_offset = search.search_page(
+                conn, query, limit=limit, offset=request.args.get('offset', 0, type=int), **filters
+            )
+            next_url = next_offset_url('courses', next_offset)
+        elif not fits:
+            courses, next_after = page_sections(conn, after=page_after(), limit=limit, **filters)
+
+        # Only keep sections that fit around the current schedule
+        if fits:
+            catalog = get_catalog(conn)
+            compatible = compatibility_check(catalog, current_schedule(conn, catalog).ids)
+            if query:
+                courses = [
+                    course for course in courses
+                    if catalog.get(course['id']) is not None and compatible(catalog.get(course['id']))
+                ]
+            else:
+                courses, next_after = page_catalog(catalog, compatible, after=page_after(), limit=limit, **filters)
 
         return render_template(
             'classes.html',  # Using classes.html for the courses display
             title='View Courses', 
             courses=courses, 
-            query=query
+            query=query,
+            fits=fits,
+            filters=filters,
+            next_url=next_url or next_page_url('courses', next_after)
+        )
+    finally:
+        conn.close()
+
+
+@app.route('/courses.json', methods=['GET'])
+def courses_json():
+    """Compact keyset-paginated catalog listing."""
+    columns = ('id', 'courseCode', 'courseName', 'instructor', 'time', 'days', 'type', 'parentID')
+    conn = get_db_connection()
+    try:
+        rows, next_after = page_sections(
+            conn, after=page_after(), limit=request.args.get('limit', PAGE_SIZE, type=int), **page_filters()
+        )
+        return jsonify(
+            columns=columns,
+            rows=[[row[column] for column in columns] for row in rows],
+            next={'after_code': next_after[0], 'after_id': next_after[1]} if next_after else None
         )
     finally:
         conn.close()
@@ -64,13 +225,78 @@ def courses():
 def search_courses():
     """Search for courses by name or code"""
     query = request.args.get('query', '')
+    filters = page_filters()
     conn = get_db_connection()
-    courses = conn.execute(
-        'SELECT * FROM Courses WHERE courseCode LIKE ? OR courseName LIKE ?',
-        (f'%{query}%', f'%{query}%')
-    ).fetchall()
+    courses, next_offset = search.search_page(
+        conn, query,
+        limit=request.args.get('limit', PAGE_SIZE, type=int),
+        offset=request.args.get('offset', 0, type=int),
+        **filters
+    )
     conn.close()
-    return render_template('search_results.html', title='Search Results', courses=courses, query=query)
+    return render_template(
+        'classes.html', title='Search Results', courses=courses, query=query, filters=filters,
+        next_url=next_offset_url('search_courses', next_offset)
+    )
+
+
+@app.route('/courses/search.json', methods=['GET'])
+def search_courses_json():
+    """Ranked type-ahead search over course codes, names and instructors."""
+    query = request.args.get('q', request.args.get('query', ''))
+    limit = request.args.get('limit', search.DEFAULT_LIMIT, type=int)
+    offset = request.args.get('offset', 0, type=int)
+    conn = get_db_connection()
+    try:
+        rows, next_offset = search.search_page(conn, query, limit=limit, offset=offset)
+        return jsonify(
+            query=query,
+            offset=offset,
+            next=next_offset,
+            results=[
+                {
+                    'id': row['id'],
+                    'courseCode': row['courseCode'],
+                    'courseName': row['courseName'],
+                    'instructor': row['instructor'],
+                    'type': row['type'],
+                    'time': row['time'],
+                    'days': row['days'],
+                }
+                for row in rows
+            ]
+        )
+    finally:
+        conn.close()
+
+@app.route('/courses/compatible.json', methods=['GET'])
+def compatible_courses_json():
+    """Keyset-paginated sections that fit around the current schedule and whose parent rules can be met."""
+    conn = get_db_connection()
+    try:
+        catalog = get_catalog(conn)
+        sections, next_after = page_catalog(
+            catalog, compatibility_check(catalog, current_schedule(conn, catalog).ids),
+            after=page_after(), limit=request.args.get('limit', PAGE_SIZE, type=int), **page_filters()
+        )
+        return jsonify(
+            count=len(sections),
+            next={'after_code': next_after[0], 'after_id': next_after[1]} if next_after else None,
+            results=[
+                {
+                    'id': section.id,
+                    'courseCode': section.courseCode,
+                    'courseName': section.courseName,
+                    'instructor': section.instructor,
+                    'type': section.type,
+                    'time': section.time,
+                    'days': section.days,
+                }
+                for section in sections
+            ]
+        )
+    finally:
+        conn.close()
 
 @app.route('/schedule', methods=['GET'])
 def view_schedule():
@@ -80,106 +306,135 @@ def view_schedule():
         SELECT s.id AS scheduleID, c.courseCode, c.courseName, c.instructor, c.time, c.days
         FROM Schedule s
         JOIN Courses c ON s.courseID = c.id
-    ''').fetchall()
+        WHERE s.userID = ?
+        ORDER BY s.id
+    ''', (current_user_id(),)).fetchall()
     conn.close()
     return render_template('schedule.html', title='Your Schedule', schedule=schedule)
 
+@app.route('/schedule/export.<any(ics, csv):fmt>', methods=['GET'])
+def export_schedule(fmt):
+    """Download the user's schedule as weekly iCalendar events or CSV."""
+    start, weeks = export_term()
+    if start is None:
+        return jsonify(error=f"Give 'start' as YYYY-MM-DD and 'weeks' from 1 to {schedule_export.MAX_WEEKS}."), 400
+
+    conn = get_db_connection()
+    try:
+        sections = current_schedule(conn).sections
+    finally:
+        conn.close()
+
+    if fmt == 'ics':
+        chunks = schedule_export.ics_stream(sections, start, weeks)
+    else:
+        chunks = schedule_export.csv_stream(sections, schedule_export.SECTION_COLUMNS)
+    return export_response(chunks, fmt, 'schedule')
+
+@app.route('/admin/export/schedules.csv', methods=['GET'])
+def export_all_schedules():
+    """Stream every user's schedule, one section per row, for advisors."""
+    require_admin()
+    rows = schedule_export.iter_rows(DATABASE, schedule_export.ALL_SCHEDULES_QUERY)
+    return export_response(schedule_export.csv_stream(rows, schedule_export.SCHEDULE_COLUMNS), 'csv', 'schedules')
+
+@app.route('/admin/export/catalog.<any(ics, csv):fmt>', methods=['GET'])
+def export_catalog(fmt):
+    """Stream the whole catalog as CSV, or every timed section as iCalendar events."""
+    require_admin()
+    start, weeks = export_term()
+    if start is None:
+        return jsonify(error=f"Give 'start' as YYYY-MM-DD and 'weeks' from 1 to {schedule_export.MAX_WEEKS}."), 400
+
+    conn = get_db_connection()
+    try:
+        catalog = get_catalog(conn)
+    finally:
+        conn.close()
+
+    # The cached catalog is already in memory, so streaming it adds only one chunk
+    if fmt == 'ics':
+        chunks = schedule_export.ics_stream(catalog.sections, start, weeks, name='Course Catalog')
+    else:
+        chunks = schedule_export.csv_stream(catalog.sections, schedule_export.SECTION_COLUMNS)
+    return export_response(chunks, fmt, f'catalog-v{catalog.version}')
+
 @app.route('/create-schedule', methods=['GET', 'POST'])
 def create_schedule():
     """Create or modify the user's schedule"""
     conn = get_db_connection()
     try:
+        catalog = get_catalog(conn)
         if request.method == 'POST':
             course_id = request.form.get('courseID')
+            user_id = current_user_id()
+            schedule = user_schedules.get_user_schedule(conn, catalog, user_id)
 
             # Get details of the selected course
-            selected_course = conn.execute('SELECT * FROM Courses WHERE id = ?', (course_id,)).fetchone()
+            selected_course = catalog.get(course_id)
             if not selected_course:
-                return render_template(
-                    'create_schedule.html', 
-                    title='Create Schedule', 
-                    error="Course not found.", 
-                    courses=conn.execute('SELECT * FROM Courses').fetchall()
+                return render_create_schedule(
+                    conn,
+                    error="Course not found."
                 )
 
             # Check if the specific course section is already in the schedule
-            existing_section = conn.execute(
-                'SELECT * FROM Schedule WHERE courseID = ?', 
-                (course_id,)
-            ).fetchone()
-            if existing_section:
-                return render_template(
-                    'create_schedule.html', 
-                    title='Create Schedule', 
-                    error="This class section is already in your schedule.", 
-                    courses=conn.execute('SELECT * FROM Courses').fetchall()
+            if selected_course['id'] in schedule.ids:
+                return render_create_schedule(
+                    conn,
+                    error="This class section is already in your schedule."
                 )
 
             # Restrict adding child sections without parent lecture
-            if selected_course['type'] in ['Lab', 'Discussion', 'Quiz']:
-                parent_ids = selected_course['parentID'].split("/")
-                parent_in_schedule = conn.execute(
-                    'SELECT * FROM Schedule WHERE courseID IN ({seq})'.format(
-                        seq=",".join(["?"] * len(parent_ids))
-                    ),
-                    parent_ids
-                ).fetchone()
+            if selected_course['type'] in CHILD_TYPES:
+                parent_in_schedule = any(
+                    parent.id in schedule.ids for parent in catalog.parents_of(selected_course['id'])
+                )
                 if not parent_in_schedule:
-                    return render_template(
-                        'create_schedule.html',
-                        title='Create Schedule',
-                        error="You must add the parent lecture before adding this section.",
-                        courses=conn.execute('SELECT * FROM Courses').fetchall()
+                    return render_create_schedule(
+                        conn,
+                        error="You must add the parent lecture before adding this section."
                     )
 
             # Check for duplicate lecture sections
             if selected_course['type'] == 'Lecture':
-                existing_lecture = conn.execute('''
-                    SELECT c.*
-                    FROM Schedule s
-                    JOIN Courses c ON s.courseID = c.id
-                    WHERE c.courseCode = ? AND c.type = 'Lecture'
-                ''', (selected_course['courseCode'],)).fetchone()
+                existing_lecture = any(
+                    section.courseCode == selected_course['courseCode'] and section.type == 'Lecture'
+                    for section in schedule.sections
+                )
                 if existing_lecture:
-                    return render_template(
-                        'create_schedule.html',
-                        title='Create Schedule',
-                        error=(f"You already have a lecture for {selected_course['courseCode']} in your schedule."),
-                        courses=conn.execute('SELECT * FROM Courses').fetchall()
+                    return render_create_schedule(
+                        conn,
+                        error=(f"You already have a lecture for {selected_course['courseCode']} in your schedule.")
                     )
 
-            # Check for time conflicts
-            schedule = conn.execute('''
-                SELECT c.*
-                FROM Schedule s
-                JOIN Courses c ON s.courseID = c.id
-            ''').fetchall()
-            for scheduled_course in schedule:
-                if has_time_conflict(
-                    selected_course['time'], selected_course['days'],
-                    scheduled_course['time'], scheduled_course['days']
-                ):
-                    conflict_message = (
-                        f"Time conflict with course: {scheduled_course['courseCode']} - {scheduled_course['courseName']} "
-                        f"({scheduled_course['time']} {scheduled_course['days']})"
-                    )
-                    return render_template(
-                        'create_schedule.html',
-                        title='Create Schedule',
-                        error=conflict_message,
-                        courses=conn.execute('SELECT * FROM Courses').fetchall()
+            # Check for time conflicts against the merged occupancy mask, then name the clash
+            conflict = schedule.conflicts_with(selected_course) and first_conflict(
+                row_meeting(selected_course),
+                ((scheduled_course, row_meeting(scheduled_course)) for scheduled_course in schedule.sections)
+            )
+            if conflict:
+                scheduled_course = conflict[0]
+                conflict_message = (
+                    f"Time conflict with course: {scheduled_course['courseCode']} - {scheduled_course['courseName']} "
+                    f"({scheduled_course['time']} {scheduled_course['days']})"
+                )
+                return render_create_schedule(
+                    conn,
+                    error=conflict_message,
+                    suggestion=suggest_swaps(
+                        catalog, schedule.ids, selected_course['id']
                     )
+                )
 
             # Add the course to the schedule
-            conn.execute('INSERT INTO Schedule (courseID) VALUES (?)', (course_id,))
+            conn.execute('INSERT INTO Schedule (userID, courseID) VALUES (?, ?)', (user_id, course_id))
+            user_schedules.touch_user(conn, user_id)
             conn.commit()
 
             # Prompt user to add associated child sections if lecture was added
             if selected_course['type'] == 'Lecture':
-                child_sections = conn.execute('''
-                    SELECT * FROM Courses 
-                    WHERE parentID LIKE ?
-                ''', (f"%{selected_course['id']}%",)).fetchall()
+                child_sections = catalog.children_of(selected_course['id'])
                 if child_sections:
                     return render_template(
                         'select_child_sections.html', 
@@ -191,100 +446,208 @@ def create_schedule():
             return redirect(url_for('view_schedule'))
 
         # For GET request
-        courses = conn.execute('SELECT * FROM Courses').fetchall()
-        return render_template('create_schedule.html', title='Create Schedule', courses=courses)
+        return render_create_schedule(conn)
     finally:
         conn.close()
 
 
+@app.route('/schedule/generate', methods=['GET'])
+def generate_schedule():
+    """Enumerate conflict-free schedules for a list of course codes as JSON."""
+    course_codes = [
+        code.strip()
+        for value in request.args.getlist('courses')
+        for code in value.split(",")
+        if code.strip()
+    ]
+    if not course_codes:
+        return jsonify(error="Provide at least one course code in 'courses'."), 400
+
+    # Zero or negative values would disable the cap or the deadline, so clamp both
+    limit = request.args.get('limit', solver.DEFAULT_LIMIT, type=int)
+    limit = min(max(limit, 1), solver.MAX_LIMIT)
+    timeout = request.args.get('timeout', solver.DEFAULT_TIMEOUT, type=float)
+    timeout = min(timeout, solver.MAX_TIMEOUT) if timeout > 0 else solver.MIN_TIMEOUT
+
+    conn = get_db_connection()
+    try:
+        try:
+            search = solver.generate_schedules(conn, course_codes, limit=limit, timeout=timeout)
+        except ValueError as e:
+            return jsonify(error=str(e)), 404
+
+        schedules = [
+            [
+                {
+                    'id': row['id'],
+                    'courseCode': row['courseCode'],
+                    'type': row['type'],
+                    'instructor': row['instructor'],
+                    'time': row['time'],
+                    'days': row['days'],
+                }
+                for row in schedule
+            ]
+            for schedule in search
+        ]
+        return jsonify(
+            courses=course_codes,
+            count=len(schedules),
+            truncated=search.truncated,
+            timedOut=search.timed_out,
+            schedules=schedules
+        )
+    finally:
+        conn.close()
+
+
+# Helper function to check a batch field is a list of section id strings
+def is_id_list(value):
+    return isinstance(value, list) and all(isinstance(section_id, str) for section_id in value)
+
+@app.route('/schedule/batch', methods=['POST'])
+def batch_update_schedule():
+    """Add and drop a set of sections in one all-or-nothing transaction."""
+    payload = request.get_json(silent=True)
+    add_ids = payload.get('add', []) if isinstance(payload, dict) else None
+    drop_ids = payload.get('drop', []) if isinstance(payload, dict) else None
+    if not is_id_list(add_ids) or not is_id_list(drop_ids) or not (add_ids or drop_ids):
+        return jsonify(ok=False, errors=[{
+            'code': 'bad_request',
+            'message': "Send a JSON object with 'add' and/or 'drop' lists of section ids.",
+            'sections': [],
+        }]), 400
+
+    conn = get_db_connection()
+    catalog = get_catalog(conn)
+    user_id = current_user_id()
+
+    # Take the write lock before reading so the validated schedule can't change underneath us
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        scheduled_ids = user_schedules.scheduled_section_ids(conn, user_id)
+        errors = validate_batch(catalog, scheduled_ids, add_ids, drop_ids)
+        if errors:
+            conn.rollback()
+            return jsonify(ok=False, errors=errors), 409
+
+        conn.executemany(
+            'DELETE FROM Schedule WHERE userID = ? AND courseID = ?',
+            ((user_id, section_id) for section_id in drop_ids)
+        )
+        conn.executemany(
+            'INSERT INTO Schedule (userID, courseID) VALUES (?, ?)',
+            ((user_id, section_id) for section_id in dict.fromkeys(add_ids))
+        )
+        user_schedules.touch_user(conn, user_id)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    return jsonify(
+        ok=True,
+        added=list(dict.fromkeys(add_ids)),
+        dropped=sorted(set(drop_ids)),
+        schedule=sorted((scheduled_ids - set(drop_ids)) | set(add_ids))
+    )
+
+
 @app.route('/schedule/remove/<int:schedule_id>', methods=['POST'])
 def remove_from_schedule(schedule_id):
     """Remove a course from the user's schedule"""
     conn = get_db_connection()
-    conn.execute('DELETE FROM Schedule WHERE id = ?', (schedule_id,))
+    user_id = current_user_id()
+    if conn.execute('DELETE FROM Schedule WHERE id = ? AND userID = ?', (schedule_id, user_id)).rowcount:
+        user_schedules.touch_user(conn, user_id)
     conn.commit()
     conn.close()
     return redirect(url_for('view_schedule'))
 
 
-def gpa_to_letter_grade(gpa):
-    """Convert a GPA value to a letter grade."""
-    if gpa >= 3.85:
-        return 'A'
-    elif gpa >= 3.50:
-        return 'A-'
-    elif gpa >= 3.15:
-        return 'B+'
-    elif gpa >= 2.85:
-        return 'B'
-    elif gpa >= 2.50:
-        return 'B-'
-    elif gpa >= 2.15:
-        return 'C+'
-    elif gpa >= 1.85:
-        return 'C'
-    elif gpa >= 1.50:
-        return 'C-'
-    elif gpa >= 1.15:
-        return 'D+'
-    elif gpa >= 0.85:
-        return 'D'
-    else:
-        return 'F'
-
 @app.route('/grades', methods=['GET', 'POST'])
 def grades():
     """Display grade statistics for a selected course."""
-    grade_files = [f.split(".")[0] for f in os.listdir('grades') if f.endswith('.txt')]
-
-    if request.method == 'POST':
-        course_code = request.form.get('courseCode')
-        filepath = os.path.join('grades', f'{course_code}.txt')
-
-        if not os.path.exists(filepath):
-            return render_template('grades.html', title='Grade Distributions', courses=grade_files, error="Grade file not found.")
-
-        # Read grades from the file
-        with open(filepath, 'r') as file:
-            grades = file.read().splitlines()
-
-        # Filter and count grades
-        grade_counts = {
-            'A': 0, 'A-': 0, 'B+': 0, 'B': 0, 'B-': 0,
-            'C+': 0, 'C': 0, 'C-': 0, 'D+': 0, 'D': 0, 'F': 0
-        }
-        numeric_grades = []
+    # Posting a course code only looks up its grades
+    conn = get_db_connection(readonly=True)
+    try:
+        if grade_store_stale(conn):
+            # Files were added or removed; re-read them in the background rather than in this request
+            try:
+                jobs.start_job('grades', DATABASE)
+            except jobs.JobConflict:
+                pass
+        if not has_grade_store(conn):
+            return render_template(
+                'grades.html', title='Grade Distributions', courses=[],
+                error="Grade data is still loading. Try again in a moment."
+            )
+        grade_files = list_grade_files(conn)
 
-        grade_to_numeric = {
-            'A': 4.0, 'A-': 3.7, 'B+': 3.3, 'B': 3.0, 'B-': 2.7,
-            'C+': 2.3, 'C': 2.0, 'C-': 1.7, 'D+': 1.3, 'D': 1.0, 'F': 0.0
-        }
+        if request.method == 'POST':
+            course_code = request.form.get('courseCode')
 
-        for grade in grades:
-            if grade in grade_counts:
-                grade_counts[grade] += 1
-                numeric_grades.append(grade_to_numeric[grade])
+            stats = get_grade_stats(conn, course_code)
+            if stats is None:
+                return render_template('grades.html', title='Grade Distributions', courses=grade_files, error="Grade file not found.")
 
-        # Calculate average grade
-        average_gpa = round(sum(numeric_grades) / len(numeric_grades), 2) if numeric_grades else 0.0
-        average_grade_letter = gpa_to_letter_grade(average_gpa)
+            grade_counts, average_grade_letter = stats
+            return render_template(
+                'grades.html',
+                title='Grade Distributions',
+                courses=grade_files,
+                selected_course=course_code,
+                grade_counts=grade_counts,
+                average_grade=average_grade_letter
+            )
 
-        return render_template(
-            'grades.html',
-            title='Grade Distributions',
-            courses=grade_files,
-            selected_course=course_code,
-            grade_counts=grade_counts,
-            average_grade=average_grade_letter
-        )
+        return render_template('grades.html', title='Grade Distributions', courses=grade_files)
+    finally:
+        conn.close()
 
-    return render_template('grades.html', title='Grade Distributions', courses=grade_files)
+@app.route('/grades/analytics.json', methods=['GET'])
+def grade_analytics_json():
+    """Pooled course distributions and ranked per-instructor statistics.
+
+    Served from the analytics cache. When grade files changed, a background
+    job recomputes it and the previous result is served until it finishes.
+    """
+    import grade_analytics  # NumPy is only needed for analytics
+
+    cached = grade_analytics.peek_analytics()
+    if cached is None or not cached[2]:
+        job = jobs.runner.active_job('analytics') or jobs.start_job('analytics', DATABASE)
+        if cached is None:
+            response = jsonify(computing=True, progress=job.progress)
+            response.status_code = 202
+            response.headers['Retry-After'] = '1'
+            return response
+    etag, analytics, _ = cached
+    course_code = request.args.get('course', '').strip()
+    etag = f"{etag}-{course_code}"
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+
+    if course_code:
+        if course_code not in analytics:
+            return jsonify(error=f"No grade data for {course_code}."), 404
+        response = jsonify(analytics[course_code])
+    else:
+        response = jsonify(courses=list(analytics.values()))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/add-child-sections', methods=['POST'])
 def add_child_sections():
     """Add parent lecture and required child sections to the schedule."""
     conn = get_db_connection()
     try:
+        catalog = get_catalog(conn)
+        user_id = current_user_id()
+        schedule = user_schedules.get_user_schedule(conn, catalog, user_id)
         selected_sections = request.form.getlist('selectedSections')
 
         if not selected_sections:
@@ -295,7 +658,7 @@ def add_child_sections():
             )
 
         # Fetch the first selected section
-        first_section = conn.execute('SELECT * FROM Courses WHERE id = ?', (selected_sections[0],)).fetchone()
+        first_section = catalog.get(selected_sections[0])
 
         if not first_section:
             return render_template(
@@ -306,43 +669,35 @@ def add_child_sections():
 
         # Get the parent lecture IDs for the selected section
         parent_ids = first_section['parentID']
-        if not parent_ids:
+        if not parent_ids or parent_ids == '0':
             return render_template(
                 'error.html',
                 title="Error",
                 message="This section does not have associated parent information."
             )
 
-        parent_ids = parent_ids.split("/")
-        parent_lecture = conn.execute(
-            'SELECT * FROM Courses WHERE id IN ({seq})'.format(seq=",".join(["?"] * len(parent_ids))),
-            parent_ids
-        ).fetchone()
-
-        if not parent_lecture:
+        # The importer resolved the parent links; dangling ones are left out
+        parent_lectures = catalog.parents_of(first_section['id'])
+        if not parent_lectures:
             return render_template(
                 'error.html',
                 title="Error",
                 message="The parent lecture for this section could not be found."
             )
 
-        # Check if the parent lecture is already in the schedule
-        parent_in_schedule = conn.execute(
-            'SELECT * FROM Schedule WHERE courseID = ?',
-            (parent_lecture['id'],)
-        ).fetchone()
+        # Prefer a parent lecture that is already in the schedule
+        parent_lecture = next(
+            (parent for parent in parent_lectures if parent.id in schedule.ids), parent_lectures[0]
+        )
+        parent_in_schedule = parent_lecture.id in schedule.ids
 
-        # Fetch all required child types for the parent lecture
-        required_child_types = conn.execute(
-            'SELECT DISTINCT type FROM Courses WHERE parentID IN ({seq})'.format(seq=",".join(["?"] * len(parent_ids))),
-            parent_ids
-        ).fetchall()
-        required_child_types = {row['type'] for row in required_child_types}
+        # Required child types were precomputed per lecture at import
+        required_child_types = catalog.required_child_types(parent_lecture.id)
 
         # Determine the types of the selected sections
         selected_types = set()
         for section_id in selected_sections:
-            child_section = conn.execute('SELECT * FROM Courses WHERE id = ?', (section_id,)).fetchone()
+            child_section = catalog.get(section_id)
 
             if not child_section:
                 return render_template(
@@ -352,10 +707,7 @@ def add_child_sections():
                 )
 
             if child_section['type'] in selected_types:
-                child_sections = conn.execute(
-                    'SELECT * FROM Courses WHERE parentID LIKE ?',
-                    (f"%{parent_ids[0]}%",)
-                ).fetchall()
+                child_sections = catalog.children_of(parent_lecture['id'])
                 return render_template(
                     'select_child_sections.html',
                     title="Select Child Sections",
@@ -369,25 +721,25 @@ def add_child_sections():
         # Check if any required types are missing
         missing_types = required_child_types - selected_types
         if missing_types:
-            child_sections = conn.execute(
-                'SELECT * FROM Courses WHERE parentID LIKE ?',
-                (f"%{parent_ids[0]}%",)
-            ).fetchall()
+            child_sections = catalog.children_of(parent_lecture['id'])
             return render_template(
                 'select_child_sections.html',
                 title="Select Child Sections",
                 parent_course=parent_lecture,
                 child_sections=child_sections,
-                error=f"The following types of sections are required but not selected: {', '.join(missing_types)}."
+                error=f"The following types of sections are required but not selected: {', '.join(sorted(missing_types))}."
             )
 
         # If parent lecture is not in the schedule, ensure it is added
         if not parent_in_schedule:
-            conn.execute('INSERT INTO Schedule (courseID) VALUES (?)', (parent_lecture['id'],))
+            conn.execute('INSERT INTO Schedule (userID, courseID) VALUES (?, ?)', (user_id, parent_lecture['id']))
 
         # Add the selected sections to the schedule
-        for section_id in selected_sections:
-            conn.execute('INSERT INTO Schedule (courseID) VALUES (?)', (section_id,))
+        conn.executemany(
+            'INSERT INTO Schedule (userID, courseID) VALUES (?, ?)',
+            ((user_id, section_id) for section_id in selected_sections)
+        )
+        user_schedules.touch_user(conn, user_id)
 
         conn.commit()
         return redirect(url_for('view_schedule'))
@@ -399,41 +751,71 @@ def add_child_sections():
 @app.route('/calendar')
 def calendar():
     """Weekly calendar view."""
+    resolution = request.args.get('resolution', calendar_grid.DEFAULT_RESOLUTION, type=int)
+    if resolution not in calendar_grid.RESOLUTIONS:
+        resolution = calendar_grid.DEFAULT_RESOLUTION
+    days = day_names(parse_days(request.args.get('days', ''))) or None
+
     conn = get_db_connection()
     try:
-        schedule = conn.execute('''
-            SELECT c.courseCode, c.courseName, c.time, c.days
-            FROM Schedule s
-            JOIN Courses c ON s.courseID = c.id
-        ''').fetchall()
-
-        events = []
-        for row in schedule:
-            time_range = row['time'].split('-')
-            if len(time_range) != 2:
-                continue  # Skip if the time format is invalid
-
-            start_time = time_range[0]
-            end_time = time_range[1]
-            try:
-                start_hour = int(start_time.split(':')[0])
-                end_hour = int(end_time.split(':')[0])
-            except ValueError:
-                continue  # Skip if start or end time isn't valid
-
-            events.append({
-                'courseCode': row['courseCode'],
-                'courseName': row['courseName'],
-                'time': row['time'],
-                'days': row['days'],  # E.g., "MW"
-                'start_hour': start_hour,
-                'end_hour': end_hour,
-            })
-
-        return render_template('calendar.html', title='Weekly Calendar', events=events)
+        user_id = current_user_id()
+        version = user_schedules.schedule_version(conn, user_id)
+        etag = f"{catalog_version(conn)}-{user_id}-{version}-{resolution}-{''.join(days or ())}"
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+
+        html = calendar_cache.get(etag)
+        if html is None:
+            schedule = current_schedule(conn)
+            grid = calendar_grid.build_grid(
+                [section._asdict() for section in schedule.sections], resolution=resolution, days=days
+            )
+            html = render_template('calendar.html', title='Weekly Calendar', grid=grid)
+            calendar_cache.put(etag, html)
+
+        response = make_response(html)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     finally:
         conn.close()
 
+@app.route('/admin/jobs/<any(reimport, grades, analytics, warm):kind>', methods=['POST'])
+def start_job(kind):
+    """Start a catalog reimport, grade reingest, analytics refresh or cache warm-up in the background."""
+    require_admin()
+    try:
+        job = jobs.start_job(kind, DATABASE)
+    except jobs.JobConflict as e:
+        return jsonify(error=str(e), job=e.job.to_dict()), 409
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers['Location'] = url_for('job_status', job_id=job.id)
+    return response
+
+@app.route('/admin/jobs', methods=['GET'])
+def list_jobs():
+    """Recent and running background jobs, newest first."""
+    require_admin()
+    return jsonify(jobs=[job.to_dict() for job in jobs.runner.jobs()])
+
+@app.route('/admin/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Progress and result of one background job."""
+    require_admin()
+    job = jobs.runner.get(job_id)
+    if job is None:
+        return jsonify(error=f"No job {job_id}."), 404
+    return jsonify(job.to_dict())
+
+@app.route('/db/stats')
+def database_stats():
+    """Connection pool usage counters."""
+    require_admin()
+    return jsonify(pools=db.pool_stats())
+
 if __name__ == '__main__':
     # Ensure the database file exists
     if not os.path.exists(DATABASE):
@@ -0,0 +1,10 @@
+"""Benchmarks for the scheduler's hot paths against synthetic catalogs.
+
+``generate_catalog.py`` writes Classes.txt-format catalogs of any size, and
+``run.py`` imports one into a scratch directory and times the import,
+search, conflict checks and the main Flask routes, writing the results as
+JSON so runs can be compared::
+
+    python -m benchmarks.run --sections 1000 100000 --output results.json
+    python -m benchmarks.run --sections 100000 --compare results.json
+"""
@@ -0,0 +1,129 @@
+"""Generate synthetic Classes.txt catalogs and grade files for benchmarking.
+
+Courses get one to four lectures and up to two child types (Lab,
+Discussion, Quiz) with several sections each. Most child sections list
+every lecture of their course as a parent, the rest hang off a single
+lecture, which mirrors the fan-out in the real Classes.txt. A few sections
+have TBA times. The same seed always produces the same catalog.
+"""
+import argparse
+import os
+import random
+
+from catalog import CHILD_TYPES
+from generate_grades import GRADE_DISTRIBUTION
+
+DEPARTMENTS = (
+    'ACCT', 'BISC', 'BUAD', 'CHEM', 'CSCI', 'ECON', 'EE', 'ITP', 'MATH', 'PHYS', 'PSYC', 'WRIT',
+)
+SUBJECTS = (
+    'Data Structures', 'Algorithms', 'Linear Algebra', 'Microeconomics', 'Organic Chemistry',
+    'Financial Accounting', 'Circuits', 'Cell Biology', 'Statistics', 'Writing', 'Mechanics',
+    'Operating Systems', 'Cognitive Psychology', 'Marketing', 'Databases', 'Thermodynamics',
+)
+LEVELS = ('Introduction to', 'Principles of', 'Advanced', 'Topics in', 'Applied')
+FIRST_NAMES = ('John', 'Eliza', 'Matt', 'Robert', 'Maria', 'Wei', 'Priya', 'Sam', 'Ana', 'David', 'Kim', 'Omar')
+LAST_NAMES = ('Smith', 'Woods', 'Perry', 'Blake', 'Garcia', 'Chen', 'Patel', 'Lee', 'Silva', 'Cohen', 'Park', 'Haddad')
+
+# (days, duration in minutes) pairs; lectures meet twice or three times a week
+LECTURE_PATTERNS = (('MW', 110), ('TTh', 110), ('MW', 80), ('TTh', 80), ('MWF', 50))
+CHILD_PATTERNS = (('M', 110), ('W', 110), ('F', 110), ('T', 50), ('Th', 50), ('TTh', 50), ('F', 50))
+
+TBA_RATE = 0.02
+SHARED_PARENT_RATE = 0.8  # Child sections that list every lecture of their course
+FIRST_ID = 10001
+
+
+def _meeting(rng, patterns):
+    if rng.random() < TBA_RATE:
+        return 'TBA', 'TBA'
+    days, duration = rng.choice(patterns)
+    start = rng.randrange(8 * 60, 20 * 60 - duration, 10)
+    end = start + duration
+    return f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}", days
+
+
+def _instructor(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def generate_rows(sections, seed=0):
+    """Yield ``sections`` Classes.txt rows as field lists."""
+    rng = random.Random(seed)
+    next_id = FIRST_ID
+    emitted = 0
+    course = 0
+    while emitted < sections:
+        code = f"{DEPARTMENTS[course % len(DEPARTMENTS)]}-{100 + course // len(DEPARTMENTS)}"
+        name = f"{rng.choice(LEVELS)} {rng.choice(SUBJECTS)}"
+        course += 1
+
+        lecture_ids = []
+        for _ in range(rng.choices((1, 2, 3, 4), weights=(50, 30, 15, 5))[0]):
+            if emitted == sections:
+                return
+            lecture_id = f"{next_id}R"
+            next_id += 1
+            lecture_ids.append(lecture_id)
+            time, days = _meeting(rng, LECTURE_PATTERNS)
+            yield [lecture_id, code, name, _instructor(rng), time, days, 'Lecture', '0']
+            emitted += 1
+
+        child_types = rng.sample(CHILD_TYPES, rng.choices((0, 1, 2), weights=(40, 45, 15))[0])
+        for child_type in child_types:
+            for _ in range(rng.randint(1, 6)):
+                if emitted == sections:
+                    return
+                if rng.random() < SHARED_PARENT_RATE:
+                    parents = "/".join(lecture_ids)
+                else:
+                    parents = rng.choice(lecture_ids)
+                time, days = _meeting(rng, CHILD_PATTERNS)
+                yield [f"{next_id}R", code, f"{name} {child_type}", 'TBA', time, days, child_type, parents]
+                next_id += 1
+                emitted += 1
+
+
+def write_catalog(path, sections, seed=0):
+    """Write a synthetic catalog to path and return the number of rows written."""
+    count = 0
+    with open(path, 'w') as file:
+        for row in generate_rows(sections, seed):
+            file.write(",".join(row) + "\n")
+            count += 1
+    return count
+
+
+def write_grade_files(directory, rows, students=40, limit=None, seed=0):
+    """Write one random grade file per (courseCode, instructor) lecture pair in rows.
+
+    Stops after ``limit`` files if given. Returns the file names without extension.
+    """
+    rng = random.Random(seed)
+    grades, weights = list(GRADE_DISTRIBUTION), list(GRADE_DISTRIBUTION.values())
+    os.makedirs(directory, exist_ok=True)
+    names = set()
+    for row in rows:
+        course_code, instructor, course_type = row[1], row[3], row[6]
+        if course_type != 'Lecture':
+            continue
+        name = f"{course_code.replace('-', '_')}_{instructor.replace(' ', '_')}"
+        if name in names:
+            continue
+        if limit is not None and len(names) >= limit:
+            break
+        names.add(name)
+        with open(os.path.join(directory, f"{name}.txt"), 'w') as file:
+            file.write("\n".join(rng.choices(grades, weights=weights, k=students)) + "\n")
+    return sorted(names)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic Classes.txt catalog.")
+    parser.add_argument("--sections", type=int, default=10000, help="Number of sections to generate.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument("--output", default="Classes.txt", help="Path of the catalog to write.")
+    args = parser.parse_args()
+
+    count = write_catalog(args.output, args.sections, args.seed)
+    print(f"Wrote {count} sections to {args.output}.")
@@ -0,0 +1,302 @@
+"""Replay registration-week traffic against the app with many concurrent students.
+
+Each simulated student gets their own session and performs a random mix of
+searches, lecture adds (answering the child-section form when it appears),
+schedule views, removals and calendar views. Students run on a thread pool,
+either in-process through the Flask test client or over HTTP against a
+local server, and every request is timed per route::
+
+    python -m benchmarks.load --students 500 --concurrency 64
+    python -m benchmarks.load --url http://127.0.0.1:5000 --database courses.db
+
+The report gives throughput, p50/p95/p99 latency, errors and SQLite lock
+errors ("database is locked", or a pool that stayed exhausted) per route.
+In-process runs use a scratch copy of the database unless --in-place is
+given, so they never touch the real schedules.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# (action, weight) pairs for what a student does next
+ACTIONS = (
+    ('search', 35),
+    ('add', 25),
+    ('calendar', 20),
+    ('schedule', 10),
+    ('remove', 10),
+)
+DEFAULT_STUDENTS = 200
+DEFAULT_CONCURRENCY = 32
+DEFAULT_ACTIONS = 12
+
+REMOVE_LINK = re.compile(r'/schedule/remove/(\d+)')
+LOCK_MARKERS = ('database is locked', 'database table is locked', 'No free connection')
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Recorder:
+    """Thread-safe per-route latencies and error counts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.lock_errors = {}
+
+    def record(self, route, seconds, ok=True, locked=False):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+            if locked:
+                self.lock_errors[route] = self.lock_errors.get(route, 0) + 1
+
+    def report(self, elapsed):
+        """Summarize every route over a run that took elapsed seconds."""
+        routes = {}
+        with self._lock:
+            for route, samples in sorted(self.latencies.items()):
+                ordered = sorted(samples)
+                routes[route] = {
+                    'requests': len(ordered),
+                    'errors': self.errors.get(route, 0),
+                    'lockErrors': self.lock_errors.get(route, 0),
+                    'throughput': round(len(ordered) / elapsed, 2),
+                    'p50Ms': round(percentile(ordered, 0.50) * 1000, 3),
+                    'p95Ms': round(percentile(ordered, 0.95) * 1000, 3),
+                    'p99Ms': round(percentile(ordered, 0.99) * 1000, 3),
+                    'maxMs': round(ordered[-1] * 1000, 3),
+                }
+        total = sum(route['requests'] for route in routes.values())
+        return {
+            'seconds': round(elapsed, 3),
+            'requests': total,
+            'throughput': round(total / elapsed, 2),
+            'errors': sum(route['errors'] for route in routes.values()),
+            'lockErrors': sum(route['lockErrors'] for route in routes.values()),
+            'routes': routes,
+        }
+
+
+class InProcessClient:
+    """One student's session against the app through the Flask test client."""
+
+    def __init__(self, flask_app):
+        self._client = flask_app.test_client()
+
+    def request(self, method, path, data=None):
+        """Return ``(status, body)``; exceptions from the app propagate."""
+        response = self._client.open(path, method=method, data=data)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    """One student's session against a running server, with its own cookie jar."""
+
+    def __init__(self, base_url):
+        self._base_url = base_url.rstrip('/')
+        self._opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+
+    def request(self, method, path, data=None):
+        """Return ``(status, body)``; redirects are returned rather than followed."""
+        body = urllib.parse.urlencode(data, doseq=True).encode() if data is not None else None
+        req = urllib.request.Request(self._base_url + path, data=body, method=method)
+        try:
+            with self._opener.open(req, timeout=30) as response:
+                return response.status, response.read().decode('utf-8', 'replace')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', 'replace')
+
+
+class Student:
+    """A simulated student working through a random sequence of actions."""
+
+    def __init__(self, client, plan, recorder, rng, think=0.0):
+        self.client = client
+        self.plan = plan
+        self.recorder = recorder
+        self.rng = rng
+        self.think = think
+        self.removable = []
+
+    def call(self, route, method, path, data=None):
+        started = time.perf_counter()
+        try:
+            status, body = self.client.request(method, path, data)
+        except sqlite3.OperationalError as e:
+            locked = any(marker in str(e) for marker in LOCK_MARKERS)
+            self.recorder.record(route, time.perf_counter() - started, ok=False, locked=locked)
+            return None, ''
+        except Exception:
+            self.recorder.record(route, time.perf_counter() - started, ok=False)
+            return None, ''
+        locked = status >= 500 and any(marker in body for marker in LOCK_MARKERS)
+        self.recorder.record(route, time.perf_counter() - started, ok=status < 400, locked=locked)
+        return status, body
+
+    def search(self):
+        query = urllib.parse.quote(self.rng.choice(self.plan['queries']))
+        self.call('search', 'GET', f'/courses?query={query}')
+
+    def add(self):
+        lecture_id = self.rng.choice(self.plan['lectures'])
+        status, body = self.call('create_schedule', 'POST', '/create-schedule', {'courseID': lecture_id})
+        children = self.plan['children'].get(lecture_id)
+        if status == 200 and children and 'selectedSections' in body:
+            selected = [self.rng.choice(sections) for sections in children.values()]
+            self.call('add_child_sections', 'POST', '/add-child-sections', {'selectedSections': selected})
+
+    def calendar(self):
+        self.call('calendar', 'GET', '/calendar')
+
+    def schedule(self):
+        status, body = self.call('schedule', 'GET', '/schedule')
+        if status == 200:
+            self.removable = REMOVE_LINK.findall(body)
+
+    def remove(self):
+        if not self.removable:
+            self.schedule()
+        if self.removable:
+            schedule_id = self.removable.pop(self.rng.randrange(len(self.removable)))
+            self.call('remove', 'POST', f'/schedule/remove/{schedule_id}')
+
+    def run(self, actions):
+        names, weights = zip(*ACTIONS)
+        for _ in range(actions):
+            getattr(self, self.rng.choices(names, weights)[0])()
+            if self.think:
+                time.sleep(self.rng.expovariate(1 / self.think))
+
+
+def load_plan(database):
+    """Read the lectures, their child sections and some search terms from a catalog."""
+    conn = sqlite3.connect(database)
+    try:
+        lectures = [row[0] for row in conn.execute("SELECT id FROM Courses WHERE type = 'Lecture'")]
+        children = {}
+        for child_id, parent_id, child_type in conn.execute('''
+            SELECT p.childID, p.parentID, c.type
+            FROM SectionParents p
+            JOIN Courses c ON c.id = p.childID
+        '''):
+            children.setdefault(parent_id, {}).setdefault(child_type, []).append(child_id)
+        queries = set()
+        for code, name, instructor in conn.execute(
+            'SELECT courseCode, courseName, instructor FROM Courses ORDER BY random() LIMIT 200'
+        ):
+            queries.update((code.split('-')[0], code, name.split()[-1], instructor or ''))
+    finally:
+        conn.close()
+    return {'lectures': lectures, 'children': children, 'queries': sorted(query for query in queries if query)}
+
+
+def run_load(make_client, plan, students, concurrency, actions, think=0.0, seed=0):
+    """Run students through make_client() on a thread pool and return the report."""
+    recorder = Recorder()
+    seeds = random.Random(seed)
+    sessions = [(make_client(), random.Random(seeds.random())) for _ in range(students)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(Student(client, plan, recorder, rng, think).run, actions)
+            for client, rng in sessions
+        ]
+        for future in futures:
+            future.result()
+    return recorder.report(time.perf_counter() - started)
+
+
+def print_report(report, file=sys.stderr):
+    """Print a per-route table of the report."""
+    print(f"{report['requests']} requests in {report['seconds']}s "
+          f"({report['throughput']} req/s), {report['errors']} errors, {report['lockErrors']} lock errors", file=file)
+    print(f"{'route':20} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'locked':>7}",
+          file=file)
+    for route, stats in report['routes'].items():
+        print(f"{route:20} {stats['requests']:9} {stats['throughput']:9} {stats['p50Ms']:9} {stats['p95Ms']:9} "
+              f"{stats['p99Ms']:9} {stats['errors']:7} {stats['lockErrors']:7}", file=file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate concurrent students registering for classes.")
+    parser.add_argument("--url", help="Base URL of a running server; runs in-process if omitted.")
+    parser.add_argument("--database", default="courses.db",
+                        help="Catalog database to draw sections from (and to serve in-process).")
+    parser.add_argument("--in-place", action="store_true",
+                        help="Serve --database itself in-process instead of a scratch copy.")
+    parser.add_argument("--students", type=int, default=DEFAULT_STUDENTS, help="Simulated students.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Students active at once.")
+    parser.add_argument("--actions", type=int, default=DEFAULT_ACTIONS, help="Actions per student.")
+    parser.add_argument("--think", type=float, default=0.0, help="Mean pause between actions, in seconds.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the request mix.")
+    parser.add_argument("--output", help="Also write the JSON report here.")
+    args = parser.parse_args()
+
+    plan = load_plan(args.database)
+    workdir = None
+    if args.url:
+        def make_client():
+            return HttpClient(args.url)
+    else:
+        import app
+        import db
+
+        database = args.database
+        if not args.in_place:
+            workdir = tempfile.mkdtemp(prefix="scheduler-load-")
+            database = os.path.join(workdir, os.path.basename(args.database))
+            shutil.copy(args.database, database)
+        app.DATABASE = os.path.abspath(database)
+        app.app.testing = True  # Let database errors reach the harness instead of becoming 500 pages
+
+        def make_client():
+            return InProcessClient(app.app)
+
+    try:
+        report = run_load(make_client, plan, args.students, args.concurrency, args.actions, args.think, args.seed)
+    finally:
+        if workdir is not None:
+            db.close_pools()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report.update(
+        mode='http' if args.url else 'in-process',
+        students=args.students,
+        concurrency=args.concurrency,
+        actionsPerStudent=args.actions,
+    )
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    print()
@@ -0,0 +1,278 @@
+"""Time the scheduler's hot paths against synthetic catalogs and emit JSON.
+
+Each catalog size gets its own scratch directory holding Classes.txt,
+courses.db and a grades/ folder, and the app is pointed at it through
+``app.DATABASE``. Every benchmark reports seconds per operation as
+``runs``, ``mean``, ``min``, ``median``, ``p95`` and ``max``. Passing
+``--compare`` checks the medians against an earlier results file and
+exits non-zero when any benchmark slowed down by more than ``--threshold``.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import app
+import catalog
+import dataimport
+import db
+import search
+from benchmarks.generate_catalog import generate_rows, write_catalog, write_grade_files
+
+DEFAULT_SIZES = (1000, 10000)
+DEFAULT_REPEAT = 20
+CONFLICT_BATCH = 10000  # has_time_conflict calls per timed batch
+GRADE_FILES = 500
+THRESHOLD = 1.2  # Median slowdown that counts as a regression
+
+
+def summarize(samples):
+    """Reduce a list of timings in seconds to summary statistics."""
+    ordered = sorted(samples)
+    count = len(ordered)
+    return {
+        'runs': count,
+        'mean': round(sum(ordered) / count, 6),
+        'min': round(ordered[0], 6),
+        'median': round(ordered[count // 2], 6),
+        'p95': round(ordered[min(count - 1, int(count * 0.95))], 6),
+        'max': round(ordered[-1], 6),
+    }
+
+
+def measure(fn, repeat):
+    """Call fn repeat times and summarize how long each call took."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def _expect(response, *statuses):
+    if response.status_code not in statuses:
+        raise RuntimeError(f"{response.request.path} returned {response.status_code}")
+    return response
+
+
+def bench_import(database, dataset, repeat):
+    """Full rebuild with dataimport.clear_and_import_data."""
+    dataimport.DATABASE, dataimport.DATASET_PATH = database, dataset
+    db.close_pools()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            dataimport.clear_and_import_data()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def bench_search(database, rows, rng, repeat):
+    """Ranked full-text search for codes, title words and instructor names."""
+    sample = rng.sample(rows, min(len(rows), 50))
+    queries = [row[1][:6] for row in sample] + [row[2].split()[-1] for row in sample] + [row[3] for row in sample]
+    conn = sqlite3.connect(database)
+    conn.row_factory = sqlite3.Row
+    try:
+        return measure(lambda: search.search_sections(conn, rng.choice(queries)), repeat * 10)
+    finally:
+        conn.close()
+
+
+def bench_conflicts(rows, rng, repeat):
+    """Batches of has_time_conflict calls on random section pairs."""
+    meetings = [(row[4], row[5]) for row in rows]
+    pairs = [rng.choice(meetings) + rng.choice(meetings) for _ in range(CONFLICT_BATCH)]
+
+    def batch():
+        for time1, days1, time2, days2 in pairs:
+            app.has_time_conflict(time1, days1, time2, days2)
+
+    stats = measure(batch, repeat)
+    stats['batchSize'] = CONFLICT_BATCH
+    return stats
+
+
+def bench_schedule_flow(database, rng, repeat):
+    """A new student adds a lecture, picks its child sections and views the calendar."""
+    conn = sqlite3.connect(database)
+    try:
+        lectures = [row[0] for row in conn.execute("SELECT id FROM Courses WHERE type = 'Lecture'")]
+        links = {}
+        for child_id, parent_id, child_type in conn.execute('''
+            SELECT p.childID, p.parentID, c.type
+            FROM SectionParents p
+            JOIN Courses c ON c.id = p.childID
+        '''):
+            links.setdefault(parent_id, {}).setdefault(child_type, []).append(child_id)
+    finally:
+        conn.close()
+
+    steps = {'create_schedule': [], 'add_child_sections': [], 'calendar': [], 'calendar_cached': [], 'calendar_304': []}
+    with_children = [lecture_id for lecture_id in lectures if lecture_id in links]
+    for _ in range(repeat):
+        lecture_id = rng.choice(with_children or lectures)
+        client = app.app.test_client()
+
+        started = time.perf_counter()
+        _expect(client.post('/create-schedule', data={'courseID': lecture_id}), 200, 302)
+        steps['create_schedule'].append(time.perf_counter() - started)
+
+        children = [rng.choice(sections) for sections in links.get(lecture_id, {}).values()]
+        if children:
+            started = time.perf_counter()
+            _expect(client.post('/add-child-sections', data={'selectedSections': children}), 200, 302)
+            steps['add_child_sections'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        response = _expect(client.get('/calendar'), 200)
+        steps['calendar'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        _expect(client.get('/calendar'), 200)
+        steps['calendar_cached'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        _expect(client.get('/calendar', headers={'If-None-Match': response.headers['ETag']}), 304)
+        steps['calendar_304'].append(time.perf_counter() - started)
+
+    return {name: summarize(samples) for name, samples in steps.items() if samples}
+
+
+def bench_grades(rows, rng, repeat):
+    """The /grades page: first build of the grade store, then listing and lookups."""
+    names = write_grade_files('grades', rows, limit=GRADE_FILES, seed=rng.random())
+    client = app.app.test_client()
+    started = time.perf_counter()
+    _expect(client.get('/grades'), 200)
+    build = time.perf_counter() - started
+    return {
+        'grades_build': summarize([build]),
+        'grades_list': measure(lambda: _expect(client.get('/grades'), 200), repeat),
+        'grades_lookup': measure(
+            lambda: _expect(client.post('/grades', data={'courseCode': rng.choice(names)}), 200), repeat
+        ),
+    }
+
+
+def run_size(sections, seed=0, repeat=DEFAULT_REPEAT, import_repeat=3, keep=False):
+    """Benchmark one catalog size in a scratch directory and return its results."""
+    rng = random.Random(seed)
+    workdir = tempfile.mkdtemp(prefix=f"scheduler-bench-{sections}-")
+    previous_dir, previous_database = os.getcwd(), app.DATABASE
+    os.chdir(workdir)  # grades/ and the other relative paths resolve here
+    try:
+        database = os.path.join(workdir, 'courses.db')
+        dataset = os.path.join(workdir, 'Classes.txt')
+        started = time.perf_counter()
+        count = write_catalog(dataset, sections, seed)
+        generate_seconds = time.perf_counter() - started
+        rows = list(generate_rows(sections, seed))
+
+        results = {'import': bench_import(database, dataset, import_repeat)}
+        app.DATABASE = database
+        catalog.invalidate()
+
+        started = time.perf_counter()
+        conn = sqlite3.connect(database)
+        try:
+            catalog.get_catalog(conn)
+        finally:
+            conn.close()
+        results['catalog_load'] = summarize([time.perf_counter() - started])
+
+        results['search'] = bench_search(database, rows, rng, repeat)
+        results['has_time_conflict'] = bench_conflicts(rows, rng, repeat)
+        results.update(bench_schedule_flow(database, rng, repeat))
+        results.update(bench_grades(rows, rng, repeat))
+
+        return {
+            'sections': count,
+            'seed': seed,
+            'generateSeconds': round(generate_seconds, 6),
+            'databaseBytes': os.path.getsize(database),
+            'benchmarks': results,
+        }
+    finally:
+        os.chdir(previous_dir)
+        app.DATABASE = previous_database
+        db.close_pools()
+        catalog.invalidate()
+        if keep:
+            print(f"Kept {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(baseline, current, threshold=THRESHOLD):
+    """Print median changes against a baseline run and return the regressions."""
+    regressions = []
+    baseline_runs = {run['sections']: run for run in baseline['runs']}
+    for run in current['runs']:
+        before = baseline_runs.get(run['sections'])
+        if before is None:
+            print(f"{run['sections']} sections: no baseline", file=sys.stderr)
+            continue
+        print(f"{run['sections']} sections:", file=sys.stderr)
+        for name, stats in run['benchmarks'].items():
+            old = before['benchmarks'].get(name)
+            if old is None or not old['median']:
+                continue
+            ratio = stats['median'] / old['median']
+            flag = ''
+            if ratio > threshold:
+                flag = '  REGRESSION'
+                regressions.append((run['sections'], name, ratio))
+            print(f"  {name:22} {old['median'] * 1000:10.3f} ms -> {stats['median'] * 1000:10.3f} ms  x{ratio:.2f}{flag}", file=sys.stderr)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scheduler against synthetic catalogs.")
+    parser.add_argument("--sections", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="Catalog sizes to benchmark, e.g. 1000 100000 1000000.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the catalog and request mix.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Timed runs per benchmark.")
+    parser.add_argument("--import-repeat", type=int, default=3, help="Timed full imports per size.")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout.")
+    parser.add_argument("--compare", help="Earlier results file to compare medians against.")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Median slowdown ratio reported as a regression.")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directories.")
+    args = parser.parse_args()
+
+    results = {
+        'createdAt': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'runs': [],
+    }
+    for sections in args.sections:
+        print(f"Benchmarking {sections} sections...", file=sys.stderr)
+        results['runs'].append(run_size(sections, args.seed, args.repeat, args.import_repeat, args.keep))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.output}.", file=sys.stderr)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(json.load(file), results, args.threshold)
+        if regressions:
+            sys.exit(1)
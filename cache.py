@@ -0,0 +1,30 @@
+"""Small in-process caches shared by the request handlers."""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A small thread-safe LRU cache, e.g. of rendered pages keyed by ETag."""
+
+    def __init__(self, size=256):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            return self._entries.pop(key, None)
@@ -0,0 +1,102 @@
+"""Day-by-slot occupancy grid for the weekly calendar view.
+
+The grid is built in one pass over the schedule: each event lands in the
+cell for its first slot with a rowspan covering its duration, and the slots
+it covers are marked so the template skips them. Events without a usable
+meeting time are returned separately instead of being dropped.
+"""
+from conflicts import DAY_BITS
+
+DAY_NAMES = {
+    'M': 'Monday',
+    'T': 'Tuesday',
+    'W': 'Wednesday',
+    'Th': 'Thursday',
+    'F': 'Friday',
+    'Sa': 'Saturday',
+    'Su': 'Sunday',
+}
+
+WEEKDAYS = ('M', 'T', 'W', 'Th', 'F')
+RESOLUTIONS = (5, 10, 15, 20, 30, 60)
+DEFAULT_RESOLUTION = 15
+DEFAULT_START = 8 * 60
+DEFAULT_END = 18 * 60
+
+# Marker for slots covered by an event that started in an earlier slot
+COVERED = object()
+
+
+def _format_minutes(minutes):
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+def build_grid(events, resolution=DEFAULT_RESOLUTION, days=None):
+    """Lay events out on a ``{day: [cell, ...]}`` grid of fixed-size slots.
+
+    ``events`` are dicts with ``startMin``, ``endMin`` and ``dayMask``
+    (``dayMask`` 0 means no usable time; ``timeStatus`` says whether such
+    an event is TBA or has a malformed time). ``days`` restricts the columns;
+    by default weekdays are shown, plus any weekend day that has classes.
+    The time range starts at 8:00 and ends at 18:00 unless events fall
+    outside it.
+    """
+    timed = [event for event in events if event['dayMask']]
+    untimed = [event for event in events if not event['dayMask']]
+
+    if days is None:
+        used = 0
+        for event in timed:
+            used |= event['dayMask']
+        days = [day for day in DAY_BITS if day in WEEKDAYS or used & DAY_BITS[day]]
+
+    start = min([DEFAULT_START] + [event['startMin'] for event in timed])
+    end = max([DEFAULT_END] + [event['endMin'] for event in timed])
+    start -= start % 60
+    end += -end % 60
+    slot_count = (end - start) // resolution
+
+    columns = {day: [None] * slot_count for day in days}
+    for event in timed:
+        first = (event['startMin'] - start) // resolution
+        last = -(-(event['endMin'] - start) // resolution)  # Round partial slots up
+        for day in days:
+            if not event['dayMask'] & DAY_BITS[day]:
+                continue
+            column = columns[day]
+            # Overlapping events share the cell of whichever started first
+            anchor = first
+            while column[anchor] is COVERED:
+                anchor -= 1
+            cell = column[anchor]
+            if cell is None:
+                cell = column[anchor] = {'events': [], 'rowspan': 1}
+            cell['events'].append(event)
+
+            span_end = max(anchor + cell['rowspan'], last)
+            slot = anchor + 1
+            while slot < span_end:
+                other = column[slot]
+                if other is not None and other is not COVERED:
+                    # A later-starting event was already placed here; fold it in
+                    cell['events'].extend(other['events'])
+                    span_end = max(span_end, slot + other['rowspan'])
+                column[slot] = COVERED
+                slot += 1
+            cell['rowspan'] = span_end - anchor
+
+    rows = []
+    for index in range(slot_count):
+        minutes = start + index * resolution
+        rows.append({
+            'label': _format_minutes(minutes) if minutes % 60 == 0 else '',
+            'cells': [(day, columns[day][index]) for day in days],
+        })
+
+    return {
+        'days': [(day, DAY_NAMES[day]) for day in days],
+        'rows': rows,
+        'resolution': resolution,
+        'untimed': untimed,
+        'covered': COVERED,
+    }
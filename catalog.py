@@ -0,0 +1,407 @@
+"""Read-through, in-process cache of the course catalog.
+
+When ``dataimport.py`` has written a snapshot for the current version the
+catalog is a ``MappedCatalog``: lookups binary-search the memory-mapped
+snapshot and decode immutable ``Section`` tuples only as they are read, so
+workers share one page-cache copy. Otherwise it is loaded from SQLite once
+into a ``Catalog`` of ``Section`` tuples indexed by id, courseCode and
+type. Both answer the same lookups. ``dataimport.py`` bumps the database's
+``PRAGMA user_version`` on every import, which is the catalog version stamp:
+a request only pays for a header read unless the catalog actually changed.
+"""
+import gc
+import threading
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from collections.abc import Sequence
+from functools import cached_property
+
+from catalog_snapshot import Snapshot, lower_bound, snapshot_path
+from conflicts import DAY_BITS
+
+CHILD_TYPES = ('Lab', 'Discussion', 'Quiz')
+
+COLUMNS = (
+    'id', 'courseCode', 'courseName', 'instructor', 'time', 'days', 'type', 'parentID',
+    'startMin', 'endMin', 'dayMask', 'timeStatus',
+)
+
+
+class Section(namedtuple('Section', COLUMNS)):
+    """Immutable catalog row that also supports ``section['column']`` access like sqlite3.Row."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return super().__getitem__(key)
+
+    def keys(self):
+        return self._fields
+
+
+class MeetingIndex:
+    """Per-day interval index over section meeting times.
+
+    Each day keeps its sections sorted by start time together with the
+    longest duration seen that day, so the sections overlapping an interval
+    are found with one bisect per day plus a scan of the candidates.
+    """
+
+    def __init__(self, sections):
+        by_day = {bit: [] for bit in DAY_BITS.values()}
+        for section in sections:
+            if section.dayMask:
+                for bit in by_day:
+                    if section.dayMask & bit:
+                        by_day[bit].append((section.startMin, section.endMin, section.id))
+
+        self._days = {}
+        for bit, intervals in by_day.items():
+            intervals.sort()
+            longest = max((end - start for start, end, _ in intervals), default=0)
+            self._days[bit] = ([start for start, _, _ in intervals], intervals, longest)
+
+    def overlapping(self, meeting):
+        """Return the ids of sections that overlap a ``(start, end, day_mask)`` meeting."""
+        found = set()
+        if meeting is None:
+            return found
+        start, end, mask = meeting
+        for bit, (starts, intervals, longest) in self._days.items():
+            if not mask & bit or not intervals:
+                continue
+            # Anything starting before start - longest has already ended
+            low = bisect_left(starts, start - longest + 1)
+            high = bisect_left(starts, end)
+            for index in range(low, high):
+                if intervals[index][1] > start:
+                    found.add(intervals[index][2])
+        return found
+
+
+class Catalog:
+    """A snapshot of the Courses table at one catalog version."""
+
+    def __init__(self, version, sections, links=(), child_types=()):
+        self.version = version
+        self.sections = tuple(sections)
+        self.by_id = {}
+        by_code = {}
+        by_type = {}
+        for section in self.sections:
+            self.by_id[section.id] = section
+            by_code.setdefault(section.courseCode, []).append(section)
+            by_type.setdefault(section.type, []).append(section)
+        # Sorted by id within each course, the order a MappedCatalog returns them in
+        self.by_code = {code: tuple(sorted(group, key=lambda section: section.id)) for code, group in by_code.items()}
+        self.by_type = {kind: tuple(group) for kind, group in by_type.items()}
+
+        # Resolved SectionParents links; dangling ids are dropped
+        children = {}
+        parents = {}
+        for child_id, parent_id in links:
+            child, parent = self.by_id.get(child_id), self.by_id.get(parent_id)
+            if child is not None and parent is not None:
+                children.setdefault(parent_id, []).append(child)
+                parents.setdefault(child_id, []).append(parent)
+        self.children = {key: tuple(group) for key, group in children.items()}
+        self.parents = {key: tuple(group) for key, group in parents.items()}
+
+        # Child section types each lecture requires, precomputed by the importer
+        required = {}
+        for parent_id, child_type in child_types:
+            required.setdefault(parent_id, set()).add(child_type)
+        self.child_types = {key: frozenset(types) for key, types in required.items()}
+
+    def get(self, section_id):
+        """Return the section with the given id, or None."""
+        return self.by_id.get(section_id)
+
+    def course_sections(self, course_code):
+        """Return every section of a course, ordered by id."""
+        return self.by_code.get(course_code, ())
+
+    @cached_property
+    def ordered(self):
+        """Sections in (courseCode, id) order, the order keyset pages walk; built on first use."""
+        return tuple(sorted(self.sections, key=lambda section: (section.courseCode, section.id)))
+
+    @cached_property
+    def ordered_keys(self):
+        """The ``(courseCode, id)`` key of every section in ``ordered``, for bisecting a cursor."""
+        return [(section.courseCode, section.id) for section in self.ordered]
+
+    @cached_property
+    def meetings(self):
+        """Interval index over every section's meeting time, built on first use."""
+        return MeetingIndex(self.sections)
+
+    def children_of(self, section_id):
+        """Return the child sections linked to a lecture."""
+        return self.children.get(section_id, ())
+
+    def parents_of(self, section_id):
+        """Return the parent lectures a child section is linked to."""
+        return self.parents.get(section_id, ())
+
+    def required_child_types(self, section_id):
+        """Return the child section types a student must pick one of each for a lecture."""
+        return self.child_types.get(section_id, frozenset())
+
+    def __len__(self):
+        return len(self.sections)
+
+
+class SnapshotSections(Sequence):
+    """A snapshot's sections as a sequence, decoded into Section tuples as they are read.
+
+    ``order``, if given, is an array of section indexes to present them in.
+    """
+
+    def __init__(self, snapshot, order=None):
+        self._snapshot = snapshot
+        self._order = order
+
+    def __len__(self):
+        return self._snapshot.count
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return Section(*self._snapshot.row(position if self._order is None else self._order[position]))
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+
+class SnapshotKeys(Sequence):
+    """The ``(courseCode, id)`` keys of a snapshot's sections in keyset order, for bisecting a cursor."""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self._order = snapshot.blocks['codeOrder']
+
+    def __len__(self):
+        return self._snapshot.count
+
+    def __getitem__(self, position):
+        index = self._order[position]
+        return self._snapshot.text(1, index), self._snapshot.text(0, index)
+
+
+class MappedMeetingIndex:
+    """MeetingIndex over the per-day (start, end, id) orders precomputed in a snapshot."""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def overlapping(self, meeting):
+        """Return the ids of sections that overlap a ``(start, end, day_mask)`` meeting."""
+        found = set()
+        if meeting is None:
+            return found
+        start, end, mask = meeting
+        blocks, ids = self._snapshot.blocks, self._snapshot.ids
+        offsets, order, starts, ends = blocks['dayOffsets'], blocks['dayOrder'], blocks['startMin'], blocks['endMin']
+
+        def start_of(position):
+            return starts[order[position]]
+
+        for day, bit in enumerate(DAY_BITS.values()):
+            if not mask & bit:
+                continue
+            # Anything starting before start - longest has already ended
+            low = lower_bound(offsets[day], offsets[day + 1], start_of, start - blocks['dayLongest'][day] + 1)
+            high = lower_bound(low, offsets[day + 1], start_of, end)
+            for position in range(low, high):
+                if ends[order[position]] > start:
+                    found.add(ids[order[position]])
+        return found
+
+
+class MappedCatalog:
+    """A Catalog served from a memory-mapped snapshot, one section decoded at a time.
+
+    Answers the same lookups as Catalog from the snapshot's precomputed
+    orders and links; apart from the decoded section ids, nothing is held
+    per section in this process.
+    """
+
+    def __init__(self, snapshot):
+        self.version = snapshot.version
+        self.snapshot = snapshot
+        self.sections = SnapshotSections(snapshot)
+        self.ordered = SnapshotSections(snapshot, snapshot.blocks['codeOrder'])
+        self.ordered_keys = SnapshotKeys(snapshot)
+        self.meetings = MappedMeetingIndex(snapshot)
+
+    def _sections(self, indexes):
+        return tuple(Section(*self.snapshot.row(index)) for index in indexes)
+
+    def get(self, section_id):
+        """Return the section with the given id, or None."""
+        index = self.snapshot.find(section_id)
+        return None if index is None else Section(*self.snapshot.row(index))
+
+    def course_sections(self, course_code):
+        """Return every section of a course, ordered by id."""
+        order, count = self.snapshot.blocks['codeOrder'], self.snapshot.count
+        position = lower_bound(0, count, lambda position: self.snapshot.text(1, order[position]), course_code)
+        end = position
+        while end < count and self.snapshot.text(1, order[end]) == course_code:
+            end += 1
+        return self._sections(order[position:end])
+
+    def children_of(self, section_id):
+        """Return the child sections linked to a lecture."""
+        index = self.snapshot.find(section_id)
+        return () if index is None else self._sections(self.snapshot.children(index))
+
+    def parents_of(self, section_id):
+        """Return the parent lectures a child section is linked to."""
+        index = self.snapshot.find(section_id)
+        return () if index is None else self._sections(self.snapshot.parents(index))
+
+    def required_child_types(self, section_id):
+        """Return the child section types a student must pick one of each for a lecture."""
+        index = self.snapshot.find(section_id)
+        return frozenset() if index is None else frozenset(self.snapshot.child_types(index))
+
+    def __len__(self):
+        return self.snapshot.count
+
+
+_catalogs = {}
+_lock = threading.Lock()
+
+
+def catalog_version(conn):
+    """Read the catalog version stamp written by dataimport.py."""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def load_catalog(conn, version):
+    """Build a Catalog from the Courses, SectionParents and LectureChildTypes tables."""
+    rows = conn.execute(
+        'SELECT {columns} FROM Courses'.format(columns=", ".join(COLUMNS))
+    ).fetchall()
+    links = conn.execute('SELECT childID, parentID FROM SectionParents').fetchall()
+    child_types = conn.execute('SELECT parentID, type FROM LectureChildTypes').fetchall()
+    return Catalog(version, (Section(*row) for row in rows), links, child_types)
+
+
+def load_catalog_snapshot(path, version):
+    """Map a snapshot file as a MappedCatalog, or return None if it's missing or stale.
+
+    The mapping stays open for as long as the catalog is referenced; a later
+    import renames a new file into place, so this one is never rewritten.
+    """
+    try:
+        snapshot = Snapshot(path)
+    except (OSError, ValueError):
+        return None
+    if snapshot.version != version:
+        snapshot.close()
+        return None
+    return MappedCatalog(snapshot)
+
+
+def get_catalog(conn):
+    """Return the cached Catalog for this database, reloading it if the version changed."""
+    database = conn.execute('PRAGMA database_list').fetchone()[2]
+    version = catalog_version(conn)
+
+    cached = _catalogs.get(database)
+    if cached is not None and cached.version == version:
+        return cached
+
+    with _lock:
+        # Another thread may have reloaded while we waited
+        cached = _catalogs.get(database)
+        if cached is None or cached.version != version:
+            # Building hundreds of thousands of tuples triggers repeated full
+            # collections that find nothing to free, so pause the collector
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                # Prefer mapping the snapshot dataimport.py wrote for this version over copying rows from SQL
+                if database:
+                    cached = load_catalog_snapshot(snapshot_path(database), version)
+                if cached is None or cached.version != version:
+                    cached = load_catalog(conn, version)
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+            _catalogs[database] = cached
+        return cached
+
+
+def invalidate():
+    """Drop every cached catalog, forcing the next request to reload."""
+    with _lock:
+        _catalogs.clear()
+
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Listing filters and the Courses column each one matches exactly
+PAGE_FILTERS = ('type', 'instructor', 'days')
+
+
+def page_sections(conn, after=None, limit=PAGE_SIZE, **filters):
+    """Return one keyset page of Courses ordered by (courseCode, id).
+
+    ``after`` is the ``(courseCode, id)`` of the last row on the previous
+    page. Filters are exact matches on type, instructor or days. Returns
+    ``(rows, next_after)`` where ``next_after`` is None on the last page.
+    Every page is an index range scan, so deep pages cost the same as the first.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    clauses = []
+    params = []
+    for column in PAGE_FILTERS:
+        if filters.get(column):
+            clauses.append(f'{column} = ?')
+            params.append(filters[column])
+    if after is not None:
+        clauses.append('(courseCode, id) > (?, ?)')
+        params.extend(after)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    rows = conn.execute(
+        f'SELECT * FROM Courses {where} ORDER BY courseCode, id LIMIT ?',
+        params + [limit + 1]
+    ).fetchall()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1]['courseCode'], rows[-1]['id'])
+    return rows, None
+
+
+def page_catalog(catalog, accept, after=None, limit=PAGE_SIZE, **filters):
+    """Return one keyset page of the cached catalog's sections that accept() allows.
+
+    Takes the same ``after``, ``limit`` and filters as ``page_sections`` and
+    returns ``(sections, next_after)``. The walk starts at the cursor in
+    ``catalog.ordered`` and stops at the first match past the page, so
+    accept() only runs on as many sections as the page needs.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    start = bisect_right(catalog.ordered_keys, tuple(after)) if after is not None else 0
+    wanted = [(column, filters[column]) for column in PAGE_FILTERS if filters.get(column)]
+    page = []
+    for position in range(start, len(catalog.ordered)):
+        section = catalog.ordered[position]
+        if any(section[column] != value for column, value in wanted) or not accept(section):
+            continue
+        if len(page) == limit:
+            return page, (page[-1].courseCode, page[-1].id)
+        page.append(section)
+    return page, None
@@ -0,0 +1,173 @@
+"""Catalog integrity facts precomputed at import time.
+
+Both importers call ``precompute`` inside their transaction, once Courses
+and SectionParents are up to date, so request handlers read these facts
+instead of deriving them per request:
+
+* SectionParents only holds links whose parent section exists. Links to
+  missing sections wait in DanglingParents and move back once a later
+  import adds the parent.
+* LectureChildTypes lists, per lecture, the child section types a student
+  has to pick one of, and how many sections offer each.
+* Courses.timeStatus, written by ``dataimport.parse_line``, says whether a
+  section's time is schedulable, TBA or malformed.
+
+``python catalog_integrity.py`` prints the dangling references, orphaned
+child sections and unreadable times in the current catalog.
+"""
+import argparse
+import json
+import sqlite3
+
+from catalog import CHILD_TYPES
+from conflicts import TIME_INVALID, TIME_OK, TIME_TBA
+
+DATABASE = "courses.db"
+
+SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS DanglingParents (
+        childID TEXT NOT NULL,
+        parentID TEXT NOT NULL,
+        PRIMARY KEY (childID, parentID)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS LectureChildTypes (
+        parentID TEXT NOT NULL,
+        type TEXT NOT NULL,
+        sections INTEGER NOT NULL,
+        PRIMARY KEY (parentID, type)
+    ) WITHOUT ROWID
+    ''',
+)
+
+_CHILD_TYPE_PLACEHOLDERS = ", ".join("?" * len(CHILD_TYPES))
+
+
+def ensure_schema(cursor):
+    """Create the integrity tables if they don't exist yet."""
+    for statement in SCHEMA:
+        cursor.execute(statement)
+
+
+def resolve_parent_links(cursor):
+    """Move links to missing parents out of SectionParents, and resolved ones back in."""
+    cursor.execute('''
+        INSERT OR IGNORE INTO DanglingParents (childID, parentID)
+        SELECT p.childID, p.parentID FROM SectionParents p
+        WHERE NOT EXISTS (SELECT 1 FROM Courses c WHERE c.id = p.parentID)
+    ''')
+    cursor.execute('''
+        DELETE FROM SectionParents
+        WHERE NOT EXISTS (SELECT 1 FROM Courses c WHERE c.id = SectionParents.parentID)
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO SectionParents (childID, parentID)
+        SELECT d.childID, d.parentID FROM DanglingParents d
+        WHERE EXISTS (SELECT 1 FROM Courses c WHERE c.id = d.parentID)
+    ''')
+    # Drop links that resolved, and those of child sections that no longer exist
+    cursor.execute('''
+        DELETE FROM DanglingParents
+        WHERE EXISTS (SELECT 1 FROM Courses c WHERE c.id = DanglingParents.parentID)
+           OR NOT EXISTS (SELECT 1 FROM Courses c WHERE c.id = DanglingParents.childID)
+    ''')
+
+
+def rebuild_child_types(cursor):
+    """Recompute every lecture's required child section types from SectionParents."""
+    cursor.execute("DELETE FROM LectureChildTypes")
+    cursor.execute('''
+        INSERT INTO LectureChildTypes (parentID, type, sections)
+        SELECT p.parentID, c.type, COUNT(*)
+        FROM SectionParents p
+        JOIN Courses c ON c.id = p.childID
+        GROUP BY p.parentID, c.type
+    ''')
+
+
+def precompute(cursor):
+    """Refresh the integrity tables for the catalog in cursor's transaction and return summary()."""
+    ensure_schema(cursor)
+    resolve_parent_links(cursor)
+    rebuild_child_types(cursor)
+    return summary(cursor)
+
+
+def summary(conn):
+    """Count dangling links, orphaned child sections and sections per time status."""
+    statuses = dict(conn.execute("SELECT timeStatus, COUNT(*) FROM Courses GROUP BY timeStatus").fetchall())
+    return {
+        'dangling': conn.execute("SELECT COUNT(*) FROM DanglingParents").fetchone()[0],
+        'orphans': conn.execute(f'''
+            SELECT COUNT(*) FROM Courses c
+            WHERE c.type IN ({_CHILD_TYPE_PLACEHOLDERS})
+              AND NOT EXISTS (SELECT 1 FROM SectionParents p WHERE p.childID = c.id)
+        ''', CHILD_TYPES).fetchone()[0],
+        'timed': statuses.get(TIME_OK, 0),
+        'tba': statuses.get(TIME_TBA, 0),
+        'invalidTimes': statuses.get(TIME_INVALID, 0),
+    }
+
+
+def integrity_report(conn, limit=None):
+    """List the problems behind summary(), at most limit of each kind."""
+    limit = -1 if limit is None else limit
+    return {
+        'summary': summary(conn),
+        'dangling': [
+            {'childID': child_id, 'parentID': parent_id}
+            for child_id, parent_id in conn.execute(
+                "SELECT childID, parentID FROM DanglingParents ORDER BY childID, parentID LIMIT ?", (limit,)
+            )
+        ],
+        'orphans': [
+            {'id': section_id, 'courseCode': course_code, 'type': section_type, 'parentID': parent_id}
+            for section_id, course_code, section_type, parent_id in conn.execute(f'''
+                SELECT c.id, c.courseCode, c.type, c.parentID FROM Courses c
+                WHERE c.type IN ({_CHILD_TYPE_PLACEHOLDERS})
+                  AND NOT EXISTS (SELECT 1 FROM SectionParents p WHERE p.childID = c.id)
+                ORDER BY c.rowid LIMIT ?
+            ''', CHILD_TYPES + (limit,))
+        ],
+        'invalidTimes': [
+            {'id': section_id, 'courseCode': course_code, 'time': time, 'days': days}
+            for section_id, course_code, time, days in conn.execute(
+                "SELECT id, courseCode, time, days FROM Courses WHERE timeStatus = ? ORDER BY rowid LIMIT ?",
+                (TIME_INVALID, limit)
+            )
+        ],
+    }
+
+
+def format_summary(counts):
+    return (
+        f"{counts['dangling']} dangling parent references, {counts['orphans']} child sections without a parent, "
+        f"{counts['tba']} TBA and {counts['invalidTimes']} unreadable meeting times"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report catalog integrity problems found at import.")
+    parser.add_argument("--database", default=DATABASE, help="Database to report on.")
+    parser.add_argument("--limit", type=int, default=50, help="Most problems of each kind to list.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database)
+    try:
+        report = integrity_report(conn, args.limit)
+    finally:
+        conn.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_summary(report['summary']) + ".")
+        for link in report['dangling']:
+            print(f"Dangling: {link['childID']} -> missing parent {link['parentID']}")
+        for section in report['orphans']:
+            print(f"Orphan: {section['id']} ({section['courseCode']} {section['type']}, parentID {section['parentID']!r})")
+        for section in report['invalidTimes']:
+            print(f"Unreadable time: {section['id']} ({section['courseCode']}) {section['time']!r} {section['days']!r}")
@@ -0,0 +1,314 @@
+"""Compact binary snapshot of the catalog, served straight from a memory map.
+
+``dataimport.py`` writes the snapshot next to the database after every
+import, and ``catalog.get_catalog`` maps it whenever its version matches
+the database's ``PRAGMA user_version``, falling back to SQLite otherwise.
+The mapping stays open for as long as that catalog version is cached and
+sections are decoded from it only when they are read, so every worker on
+a host shares the same page-cache copy instead of holding its own rows.
+The orders and links lookups need are precomputed here; the only thing a
+worker decodes up front is the list of section ids, which every lookup
+and overlap query compares against.
+
+Layout:
+
+* a 36-byte header: magic, format, catalog version, section count,
+  string count, link count, child type count and string table size;
+* fixed-width per-section arrays: start and end minutes (int16, -1 when
+  untimed) and day masks (uint8);
+* one uint32 string-table index per section for each text column, so
+  repeated codes, names and instructors are stored and decoded once;
+* parent -> children and child -> parents links as offset/index arrays,
+  and each lecture's required child types as offset/string-index arrays;
+* section indexes sorted by id, and by (courseCode, id), for binary
+  searches and keyset pages;
+* per weekday, the indexes of the sections meeting that day sorted by
+  (start, end, id), with the longest meeting of each day, for overlap
+  queries;
+* the string table itself: uint32 offsets into one UTF-8 blob.
+
+Each block starts on an 8-byte boundary. Snapshots are written to a temp
+file and renamed into place, so readers never see a partial file.
+"""
+import argparse
+from functools import cached_property
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+from array import array
+
+from conflicts import DAY_BITS
+
+MAGIC = b'CATSNAP\0'
+FORMAT_VERSION = 3
+# magic, format, version, sections, strings, links, child types, string bytes, day entries
+HEADER = struct.Struct('<8sIIIIIIII')
+COUNTS = ('sections', 'strings', 'links', 'childTypes', 'stringBytes', 'dayEntries')
+NO_STRING = 0xFFFFFFFF
+NO_TIME = -1
+
+# Stored columns; rows are returned in the order of COLUMNS, which matches catalog.COLUMNS
+TEXT_COLUMNS = ('id', 'courseCode', 'courseName', 'instructor', 'time', 'days', 'type', 'parentID', 'timeStatus')
+TIME_COLUMNS = ('startMin', 'endMin', 'dayMask')
+COLUMNS = TEXT_COLUMNS[:-1] + TIME_COLUMNS + TEXT_COLUMNS[-1:]
+
+# (name, array typecode, number of items given the header's COUNTS)
+BLOCKS = (
+    ('startMin', 'h', lambda counts: counts['sections']),
+    ('endMin', 'h', lambda counts: counts['sections']),
+    ('dayMask', 'B', lambda counts: counts['sections']),
+    ('text', 'I', lambda counts: counts['sections'] * len(TEXT_COLUMNS)),
+    ('childOffsets', 'I', lambda counts: counts['sections'] + 1),
+    ('children', 'I', lambda counts: counts['links']),
+    ('parentOffsets', 'I', lambda counts: counts['sections'] + 1),
+    ('parents', 'I', lambda counts: counts['links']),
+    ('childTypeOffsets', 'I', lambda counts: counts['sections'] + 1),
+    ('childTypes', 'I', lambda counts: counts['childTypes']),
+    ('idOrder', 'I', lambda counts: counts['sections']),
+    ('codeOrder', 'I', lambda counts: counts['sections']),
+    ('dayOffsets', 'I', lambda counts: len(DAY_BITS) + 1),
+    ('dayOrder', 'I', lambda counts: counts['dayEntries']),
+    ('dayLongest', 'h', lambda counts: len(DAY_BITS)),
+    ('stringOffsets', 'I', lambda counts: counts['strings'] + 1),
+    ('strings', 'B', lambda counts: counts['stringBytes']),
+)
+
+
+def snapshot_path(database):
+    """Return the snapshot file that belongs to a database file."""
+    return os.path.splitext(database)[0] + '.snapshot'
+
+
+def snapshot_matches(path, version):
+    """Check whether path holds a readable snapshot of this format for catalog version."""
+    try:
+        snapshot = Snapshot(path)
+    except (OSError, ValueError):
+        return False
+    try:
+        return snapshot.version == version
+    finally:
+        snapshot.close()
+
+
+def lower_bound(low, high, key, target):
+    """Return the first index in [low, high) whose key is not below target, keys being sorted."""
+    while low < high:
+        middle = (low + high) // 2
+        if key(middle) < target:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def _align(offset):
+    return offset + (-offset % 8)
+
+
+def _csr(groups, count):
+    """Flatten per-section lists of section indexes into offset and index arrays."""
+    offsets = array('I', [0])
+    indexes = array('I')
+    for index in range(count):
+        indexes.extend(groups.get(index, ()))
+        offsets.append(len(indexes))
+    return offsets, indexes
+
+
+def write_snapshot(conn, path, version=None):
+    """Write the catalog in conn to path and return the number of sections."""
+    if sys.byteorder != 'little':
+        raise RuntimeError("Catalog snapshots are little-endian only.")
+    if version is None:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+    rows = conn.execute(
+        'SELECT {columns} FROM Courses ORDER BY rowid'.format(columns=", ".join(COLUMNS))
+    ).fetchall()
+    count = len(rows)
+    position = {row[0]: index for index, row in enumerate(rows)}
+
+    strings = {}
+    text = array('I', [0]) * (count * len(TEXT_COLUMNS))
+    start_min, end_min, day_mask = array('h'), array('h'), array('B')
+    for index, row in enumerate(rows):
+        section = dict(zip(COLUMNS, row))
+        for column_index, column in enumerate(TEXT_COLUMNS):
+            value = section[column]
+            text[column_index * count + index] = (
+                NO_STRING if value is None else strings.setdefault(value, len(strings))
+            )
+        timed = bool(section['dayMask'])
+        start_min.append(section['startMin'] if timed else NO_TIME)
+        end_min.append(section['endMin'] if timed else NO_TIME)
+        day_mask.append(section['dayMask'] or 0)
+
+    children, parents = {}, {}
+    links = 0
+    for child_id, parent_id in conn.execute('SELECT childID, parentID FROM SectionParents'):
+        child, parent = position.get(child_id), position.get(parent_id)
+        if child is not None and parent is not None:
+            children.setdefault(parent, []).append(child)
+            parents.setdefault(child, []).append(parent)
+            links += 1
+    child_offsets, child_indexes = _csr(children, count)
+    parent_offsets, parent_indexes = _csr(parents, count)
+
+    required, type_count = {}, 0
+    for parent_id, child_type in conn.execute('SELECT parentID, type FROM LectureChildTypes ORDER BY parentID, type'):
+        parent = position.get(parent_id)
+        if parent is not None:
+            required.setdefault(parent, []).append(strings.setdefault(child_type, len(strings)))
+            type_count += 1
+    type_offsets, type_indexes = _csr(required, count)
+
+    id_order = array('I', sorted(range(count), key=lambda index: rows[index][0]))
+    code_order = array('I', sorted(range(count), key=lambda index: (rows[index][1], rows[index][0])))
+    day_offsets, day_order, day_longest = array('I', [0]), array('I'), array('h')
+    for bit in DAY_BITS.values():
+        meeting = sorted(
+            (start_min[index], end_min[index], rows[index][0], index)
+            for index in range(count) if day_mask[index] & bit
+        )
+        day_order.extend(index for _, _, _, index in meeting)
+        day_offsets.append(len(day_order))
+        day_longest.append(max((end - start for start, end, _, _ in meeting), default=0))
+
+    blob = bytearray()
+    string_offsets = array('I', [0])
+    for value in strings:
+        blob += str(value).encode('utf-8')
+        string_offsets.append(len(blob))
+
+    blocks = {
+        'startMin': start_min, 'endMin': end_min, 'dayMask': day_mask, 'text': text,
+        'childOffsets': child_offsets, 'children': child_indexes,
+        'parentOffsets': parent_offsets, 'parents': parent_indexes,
+        'childTypeOffsets': type_offsets, 'childTypes': type_indexes,
+        'idOrder': id_order, 'codeOrder': code_order,
+        'dayOffsets': day_offsets, 'dayOrder': day_order, 'dayLongest': day_longest,
+        'stringOffsets': string_offsets, 'strings': blob,
+    }
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as file:
+        file.write(HEADER.pack(
+            MAGIC, FORMAT_VERSION, version, count, len(strings), links, type_count, len(blob), len(day_order)
+        ))
+        for name, _, _ in BLOCKS:
+            file.write(b'\0' * (_align(file.tell()) - file.tell()))
+            file.write(bytes(blocks[name]))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+    return count
+
+
+class Snapshot:
+    """A memory-mapped snapshot file with its blocks exposed as typed memoryviews."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        self.blocks = {}
+        try:
+            magic, format_version, version, *counts = HEADER.unpack_from(self._map)
+            if magic != MAGIC or format_version != FORMAT_VERSION or sys.byteorder != 'little':
+                raise ValueError(f"{path} is not a format {FORMAT_VERSION} catalog snapshot")
+            counts = dict(zip(COUNTS, counts))
+            self.version, self.count, self.link_count = version, counts['sections'], counts['links']
+
+            offset = HEADER.size
+            for name, typecode, length in BLOCKS:
+                offset = _align(offset)
+                items = length(counts)
+                size = items * array(typecode).itemsize
+                if offset + size > len(self._map):
+                    raise ValueError(f"{path} is truncated")
+                self.blocks[name] = self._view[offset:offset + size].cast(typecode)
+                offset += size
+        except (struct.error, ValueError):
+            self.close()
+            raise
+
+    def string(self, index):
+        """Decode one entry of the string table."""
+        if index == NO_STRING:
+            return None
+        offsets = self.blocks['stringOffsets']
+        return str(self.blocks['strings'][offsets[index]:offsets[index + 1]], 'utf-8')
+
+    def text(self, column, index):
+        """Decode one text column, by its position in TEXT_COLUMNS, of the section at index."""
+        if column == 0:
+            return self.ids[index]
+        return self.string(self.blocks['text'][column * self.count + index])
+
+    @cached_property
+    def ids(self):
+        """Every section id in catalog order, decoded once."""
+        text = self.blocks['text']
+        return [self.string(text[index]) for index in range(self.count)]
+
+    def row(self, index):
+        """Decode the section at index into a tuple of COLUMNS values."""
+        start, end = self.blocks['startMin'][index], self.blocks['endMin'][index]
+        text = [self.text(column, index) for column in range(len(TEXT_COLUMNS))]
+        return (*text[:-1], None if start == NO_TIME else start, None if end == NO_TIME else end,
+                self.blocks['dayMask'][index], text[-1])
+
+    def find(self, section_id):
+        """Return the index of the section with the given id, or None."""
+        order, ids = self.blocks['idOrder'], self.ids
+        position = lower_bound(0, self.count, lambda position: ids[order[position]], section_id)
+        if position < self.count and ids[order[position]] == section_id:
+            return order[position]
+        return None
+
+    def children(self, index):
+        """Return the indexes of the child sections linked to the lecture at index."""
+        offsets = self.blocks['childOffsets']
+        return self.blocks['children'][offsets[index]:offsets[index + 1]]
+
+    def parents(self, index):
+        """Return the indexes of the lectures the child section at index is linked to."""
+        offsets = self.blocks['parentOffsets']
+        return self.blocks['parents'][offsets[index]:offsets[index + 1]]
+
+    def child_types(self, index):
+        """Return the child section types the lecture at index requires."""
+        offsets = self.blocks['childTypeOffsets']
+        return [self.string(value) for value in self.blocks['childTypes'][offsets[index]:offsets[index + 1]]]
+
+    def close(self):
+        # The views must be released before the map can be closed
+        for block in self.blocks.values():
+            block.release()
+        self.blocks = {}
+        self._view.release()
+        self._map.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write or inspect the catalog snapshot.")
+    parser.add_argument("--database", default="courses.db", help="Database to snapshot.")
+    parser.add_argument("--info", action="store_true", help="Print the snapshot header instead of writing it.")
+    args = parser.parse_args()
+
+    path = snapshot_path(args.database)
+    if args.info:
+        snapshot = Snapshot(path)
+        print(f"{path}: catalog version {snapshot.version}, {snapshot.count} sections, {snapshot.link_count} links, "
+              f"{os.path.getsize(path):,} bytes")
+        snapshot.close()
+    else:
+        conn = sqlite3.connect(args.database)
+        try:
+            count = write_snapshot(conn, path)
+        finally:
+            conn.close()
+        print(f"Wrote {count} sections to {path}.")
@@ -0,0 +1,63 @@
+"""Find the catalog sections that could still be added to a schedule.
+
+Clashes are found by probing the catalog's per-day interval index once per
+scheduled section, so the cost grows with the number of overlapping
+sections rather than with catalog size times schedule size. Parent rules
+are then applied: a lecture fits only if every required child type still
+has a section that fits alongside it, and a child fits only if one of its
+lectures is scheduled or could be added with it. Lecture verdicts are
+worked out on demand and remembered, so checking one page of sections
+only looks at the lectures that page needs.
+"""
+from catalog import CHILD_TYPES
+from conflicts import meetings_overlap, row_meeting
+
+
+def compatibility_check(catalog, scheduled_ids):
+    """Return a function telling whether a catalog section can be added to the schedule."""
+    scheduled = [catalog.get(section_id) for section_id in scheduled_ids]
+    scheduled = [section for section in scheduled if section is not None]
+    scheduled_ids = {section.id for section in scheduled}
+
+    blocked = set(scheduled_ids)
+    for section in scheduled:
+        blocked |= catalog.meetings.overlapping(row_meeting(section))
+
+    lecture_codes = {section.courseCode for section in scheduled if section.type == 'Lecture'}
+    filled = {(section.courseCode, section.type) for section in scheduled if section.type in CHILD_TYPES}
+
+    lecture_fits = {}
+
+    def lecture_ok(lecture):
+        if lecture.id not in lecture_fits:
+            fits = lecture.id not in blocked and lecture.courseCode not in lecture_codes
+            if fits:
+                meeting = row_meeting(lecture)
+                available = {}
+                for child in catalog.children_of(lecture.id):
+                    ok = child.id not in blocked and not meetings_overlap(meeting, row_meeting(child))
+                    available[child.type] = available.get(child.type, False) or ok
+                fits = all(available.values())
+            lecture_fits[lecture.id] = fits
+        return lecture_fits[lecture.id]
+
+    def child_ok(child):
+        if child.id in blocked or (child.courseCode, child.type) in filled:
+            return False
+        meeting = row_meeting(child)
+        return any(
+            parent.id in scheduled_ids
+            or (lecture_ok(parent) and not meetings_overlap(meeting, row_meeting(parent)))
+            for parent in catalog.parents_of(child.id)
+        )
+
+    def fits(section):
+        return lecture_ok(section) if section.type == 'Lecture' else child_ok(section)
+
+    return fits
+
+
+def compatible_sections(catalog, scheduled_ids):
+    """Return the sections that can be added to the schedule, in catalog order."""
+    fits = compatibility_check(catalog, scheduled_ids)
+    return [section for section in catalog.sections if fits(section)]
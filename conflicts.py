@@ -0,0 +1,198 @@
+"""Meeting-time parsing and conflict checks on precompiled integer times.
+
+A meeting is a ``(start, end, day_mask)`` tuple: minutes since midnight for
+the half-open interval ``[start, end)`` and a bitmask of the weekdays the
+section meets on. ``dataimport.py`` stores these in the ``startMin``,
+``endMin`` and ``dayMask`` columns so request handlers never re-parse the
+``time``/``days`` strings.
+"""
+
+# Weekday bits, in calendar order
+DAY_BITS = {
+    'M': 1,
+    'T': 2,
+    'W': 4,
+    'Th': 8,
+    'F': 16,
+    'Sa': 32,
+    'Su': 64,
+}
+
+MINUTES_PER_DAY = 24 * 60
+
+# Values of the Courses.timeStatus column
+TIME_OK = 'ok'
+TIME_TBA = 'tba'
+TIME_INVALID = 'invalid'
+
+# Two-letter tokens must be tried before their one-letter prefixes ("Th" vs "T")
+_DAY_TOKENS = sorted(DAY_BITS, key=len, reverse=True)
+
+
+def parse_days(days):
+    """Convert a days string like "TTh" or "MWF" to a weekday bitmask.
+
+    Returns 0 for "TBA", empty or unrecognised strings.
+    """
+    if not days or days == "TBA":
+        return 0
+
+    mask = 0
+    i = 0
+    while i < len(days):
+        for token in _DAY_TOKENS:
+            if days.startswith(token, i):
+                mask |= DAY_BITS[token]
+                i += len(token)
+                break
+        else:
+            return 0  # Unknown day token
+    return mask
+
+
+def day_names(mask):
+    """Return the day tokens set in a bitmask, in calendar order."""
+    return [day for day, bit in DAY_BITS.items() if mask & bit]
+
+
+def parse_clock(value):
+    """Convert "HH:MM" to minutes since midnight, or None if malformed."""
+    hours, sep, minutes = value.strip().partition(":")
+    if not sep or not hours.isdigit() or not minutes.isdigit():
+        return None
+    hours, minutes = int(hours), int(minutes)
+    # 24:00 is the only valid time in hour 24
+    if minutes > 59 or hours * 60 + minutes > MINUTES_PER_DAY:
+        return None
+    return hours * 60 + minutes
+
+
+def parse_time(time):
+    """Convert "HH:MM-HH:MM" to a ``(start, end)`` minute pair.
+
+    Returns None for "TBA" or anything that doesn't parse to a non-empty range.
+    """
+    if not time or time == "TBA":
+        return None
+
+    parts = time.split("-")
+    if len(parts) != 2:
+        return None
+    start, end = parse_clock(parts[0]), parse_clock(parts[1])
+    if start is None or end is None or end <= start:
+        return None
+    return start, end
+
+
+def parse_meeting(time, days):
+    """Parse the raw time/days strings into a ``(start, end, day_mask)`` tuple.
+
+    Returns None when the section has no schedulable meeting time.
+    """
+    span = parse_time(time)
+    mask = parse_days(days)
+    if span is None or not mask:
+        return None
+    return span[0], span[1], mask
+
+
+def time_status(time, days):
+    """Classify raw time/days strings as TIME_OK, TIME_TBA or TIME_INVALID.
+
+    A section is TBA when either field is empty or "TBA", and invalid when
+    both are given but don't parse to a meeting.
+    """
+    if parse_meeting(time, days) is not None:
+        return TIME_OK
+    if not time or not days or time == "TBA" or days == "TBA":
+        return TIME_TBA
+    return TIME_INVALID
+
+
+def occupancy_mask(meeting):
+    """Expand a meeting tuple into a week-long bitmask with one bit per minute.
+
+    Two sections clash exactly when their masks share a bit, so a whole
+    schedule's occupancy can be merged with ``|`` and tested with ``&``.
+    """
+    if meeting is None:
+        return 0
+    start, end, mask = meeting
+    span = ((1 << (end - start)) - 1) << start
+    occupancy = 0
+    for index, bit in enumerate(DAY_BITS.values()):
+        if mask & bit:
+            occupancy |= span << (index * MINUTES_PER_DAY)
+    return occupancy
+
+
+def row_meeting(row):
+    """Read the precompiled meeting tuple from a Courses row, or None."""
+    if row['dayMask']:
+        return row['startMin'], row['endMin'], row['dayMask']
+    return None
+
+
+def meetings_overlap(a, b):
+    """Check whether two meeting tuples share a day and overlap in time."""
+    if a is None or b is None:
+        return False
+    return bool(a[2] & b[2]) and a[0] < b[1] and b[0] < a[1]
+
+
+def first_conflict(meeting, others):
+    """Return the first ``(key, meeting)`` pair in others that overlaps meeting.
+
+    ``others`` is an iterable of ``(key, meeting)`` pairs, e.g. the sections
+    already on a schedule. Returns None if nothing clashes.
+    """
+    if meeting is None:
+        return None
+    start, end, mask = meeting
+    for key, other in others:
+        if other is not None and mask & other[2] and start < other[1] and other[0] < end:
+            return key, other
+    return None
+
+
+def find_conflicts(candidates, scheduled=()):
+    """Find every overlapping pair in one sweep over a batch of sections.
+
+    ``candidates`` and ``scheduled`` are iterables of ``(key, meeting)``
+    pairs. Returns a list of ``(candidate_key, other_key)`` pairs where
+    ``other_key`` is either a scheduled section or another candidate;
+    clashes among the scheduled sections themselves are not reported.
+    """
+    # Flatten into per-day intervals tagged with whether they are candidates
+    intervals = []
+    for is_candidate, group in ((True, candidates), (False, scheduled)):
+        for key, meeting in group:
+            if meeting is None:
+                continue
+            start, end, mask = meeting
+            for bit in DAY_BITS.values():
+                if mask & bit:
+                    intervals.append((bit, start, end, is_candidate, key))
+    intervals.sort(key=lambda item: (item[0], item[1]))
+
+    conflicts = []
+    seen = set()
+    active = []
+    current_day = None
+    for day, start, end, is_candidate, key in intervals:
+        if day != current_day:
+            current_day = day
+            active = []
+        active = [item for item in active if item[0] > start]
+        for other_end, other_is_candidate, other_key in active:
+            if not (is_candidate or other_is_candidate):
+                continue
+            if is_candidate:
+                pair = (key, other_key)
+            else:
+                pair = (other_key, key)
+            if pair[0] != pair[1] and frozenset(pair) not in seen:
+                seen.add(frozenset(pair))
+                conflicts.append(pair)
+        active.append((end, is_candidate, key))
+    return conflicts
@@ -1,10 +1,26 @@
+import argparse
 import sqlite3
+import time
+
+import catalog_integrity
+from conflicts import parse_meeting, time_status
+from catalog_snapshot import snapshot_matches, snapshot_path, write_snapshot
+from search import rebuild_search_index, delete_search_rows, index_search_rows, search_index_current
+from user_schedules import ensure_schema as ensure_schedule_schema
 
 DATABASE = "courses.db"
 DATASET_PATH = "Classes.txt"
 
+CHUNK_SIZE = 5000
+
+COURSE_COLUMNS = (
+    "id", "courseCode", "courseName", "instructor", "time", "days", "type", "parentID",
+    "startMin", "endMin", "dayMask", "timeStatus",
+)
+
+# Formatted with the table name so the incremental import can stage into a copy
 SCHEMA = """
-CREATE TABLE IF NOT EXISTS Courses (
+CREATE TABLE IF NOT EXISTS {table} (
     id TEXT PRIMARY KEY,
     courseCode TEXT NOT NULL,
     courseName TEXT NOT NULL,
@@ -12,10 +28,177 @@ CREATE TABLE IF NOT EXISTS Courses (
     time TEXT,
     days TEXT,
     type TEXT,
-    parentID TEXT
+    parentID TEXT,
+    startMin INTEGER,
+    endMin INTEGER,
+    dayMask INTEGER NOT NULL DEFAULT 0,
+    timeStatus TEXT NOT NULL DEFAULT 'ok'
 );
 """
 
+# Keyset pagination walks (courseCode, id); the filtered listings lead with their filter column
+COURSE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_courses_code_id ON Courses (courseCode, id)",
+    "CREATE INDEX IF NOT EXISTS idx_courses_type ON Courses (type, courseCode, id)",
+    "CREATE INDEX IF NOT EXISTS idx_courses_instructor ON Courses (instructor, courseCode, id)",
+    "CREATE INDEX IF NOT EXISTS idx_courses_days ON Courses (days, courseCode, id)",
+)
+
+INSERT_COURSE = f"""
+{{action}} INTO {{table}} ({", ".join(COURSE_COLUMNS)})
+VALUES ({", ".join(["?"] * len(COURSE_COLUMNS))})
+"""
+
+# Bulk-load settings: WAL lets readers continue while the import transaction runs
+IMPORT_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+)
+
+PARENTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS SectionParents (
+    childID TEXT NOT NULL,
+    parentID TEXT NOT NULL,
+    PRIMARY KEY (childID, parentID)
+) WITHOUT ROWID;
+"""
+
+# The primary key covers child -> parent lookups; this covers parent -> child
+PARENTS_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_section_parents_parent ON SectionParents (parentID, childID);
+"""
+
+# Columns added since the first schema; older databases get them on their next incremental import
+# Columns derived from time and days that older Courses tables lack
+ADDED_COURSE_COLUMNS = (
+    ("startMin", "INTEGER"),
+    ("endMin", "INTEGER"),
+    ("dayMask", "INTEGER NOT NULL DEFAULT 0"),
+    ("timeStatus", "TEXT NOT NULL DEFAULT 'ok'"),
+)
+
+def ensure_course_columns(cursor):
+    """Add any ADDED_COURSE_COLUMNS missing from an older Courses table."""
+    existing = {row[1] for row in cursor.execute("PRAGMA table_info(Courses)")}
+    for column, definition in ADDED_COURSE_COLUMNS:
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE Courses ADD COLUMN {column} {definition}")
+
+def upgrade_catalog(conn, database=DATABASE):
+    """Bring a catalog imported by an older dataimport.py up to date without reimporting it.
+
+    Adds the ADDED_COURSE_COLUMNS and the listing indexes, filling the
+    precompiled meeting and timeStatus in from each section's stored time
+    and days, fills in the link and integrity tables if they are missing,
+    and rewrites the snapshot if it is missing, stale or in an older format.
+    Returns True if the catalog changed, in which case its version is bumped.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(Courses)")}
+        if not columns:
+            # Nothing imported yet
+            conn.rollback()
+            return False
+        changed = False
+        ensure_course_columns(conn)
+        for statement in COURSE_INDEXES:
+            conn.execute(statement)
+        if any(column not in columns for column, _ in ADDED_COURSE_COLUMNS):
+            rows = conn.execute("SELECT id, time, days FROM Courses").fetchall()
+            conn.executemany(
+                "UPDATE Courses SET startMin = ?, endMin = ?, dayMask = ?, timeStatus = ? WHERE id = ?",
+                ((*(parse_meeting(time, days) or (None, None, 0)), time_status(time, days), course_id)
+                 for course_id, time, days in rows)
+            )
+            changed = True
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "LectureChildTypes" not in tables:
+            if "SectionParents" not in tables:
+                rebuild_section_parents(conn)
+            catalog_integrity.precompute(conn)
+            changed = True
+        version = bump_catalog_version(conn) if changed else conn.execute("PRAGMA user_version").fetchone()[0]
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    path = snapshot_path(database)
+    if not snapshot_matches(path, version):
+        write_snapshot(conn, path, version)
+    return changed
+
+def split_parent_ids(parent_id):
+    """Split a slash-joined parentID field into its parent section ids."""
+    if not parent_id or parent_id == "0":
+        return []
+    return [pid for pid in parent_id.split("/") if pid]
+
+def rebuild_section_parents(cursor):
+    """Repopulate the SectionParents link table from Courses.parentID."""
+    cursor.execute("DROP TABLE IF EXISTS SectionParents")
+    cursor.execute("DROP TABLE IF EXISTS DanglingParents")
+    cursor.execute(PARENTS_SCHEMA)
+    cursor.execute(PARENTS_INDEX)
+    rows = cursor.execute("SELECT id, parentID FROM Courses").fetchall()
+    cursor.executemany(
+        "INSERT OR IGNORE INTO SectionParents (childID, parentID) VALUES (?, ?)",
+        ((course_id, pid) for course_id, parent_id in rows for pid in split_parent_ids(parent_id))
+    )
+
+def sync_section_parents(cursor, child_ids):
+    """Refresh the SectionParents links for the given child sections only."""
+    links = []
+    for child_id in child_ids:
+        row = cursor.execute("SELECT parentID FROM Courses WHERE id = ?", (child_id,)).fetchone()
+        if row is not None:
+            links.extend((child_id, pid) for pid in split_parent_ids(row[0]))
+
+    cursor.executemany("DELETE FROM SectionParents WHERE childID = ?", ((child_id,) for child_id in child_ids))
+    cursor.executemany("DELETE FROM DanglingParents WHERE childID = ?", ((child_id,) for child_id in child_ids))
+    cursor.executemany("INSERT OR IGNORE INTO SectionParents (childID, parentID) VALUES (?, ?)", links)
+
+def bump_catalog_version(cursor):
+    """Advance the catalog version stamp so app caches reload the catalog."""
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    cursor.execute(f"PRAGMA user_version = {version + 1}")
+    return version + 1
+
+def parse_line(line):
+    """Split one Classes.txt line into a Courses row tuple, or None if malformed."""
+    fields = line.strip().split(",")
+
+    # Validate row format
+    if len(fields) != 8:
+        return None
+
+    course_id, course_code, course_name, instructor, time, days, course_type, parent_id = fields
+
+    # Precompile the meeting time so conflict checks compare integers
+    start_min, end_min, day_mask = parse_meeting(time, days) or (None, None, 0)
+
+    return (course_id, course_code, course_name, instructor, time, days, course_type, parent_id,
+            start_min, end_min, day_mask, time_status(time, days))
+
+def read_dataset(path, chunk_size=CHUNK_SIZE):
+    """Stream parsed rows from the dataset in lists of at most chunk_size rows."""
+    chunk = []
+    with open(path, "r") as file:
+        for line_number, line in enumerate(file, start=1):
+            row = parse_line(line)
+            if row is None:
+                print(f"Skipping invalid row {line_number}: {line.strip()}")
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
 def clear_and_import_data():
     conn = sqlite3.connect(DATABASE)
     cursor = conn.cursor()
@@ -23,36 +206,201 @@ def clear_and_import_data():
     try:
         # Drop and recreate the table
         cursor.execute("DROP TABLE IF EXISTS Courses")
-        cursor.execute(SCHEMA)
+        cursor.execute(SCHEMA.format(table="Courses"))
         print("Recreated Courses table.")
 
         # Read and validate the dataset
         with open(DATASET_PATH, "r") as file:
             for line_number, line in enumerate(file, start=1):
-                fields = line.strip().split(",")
-
-                # Validate row format
-                if len(fields) != 8:
+                row = parse_line(line)
+                if row is None:
                     print(f"Skipping invalid row {line_number}: {line.strip()}")
                     continue
 
-                course_id, course_code, course_name, instructor, time, days, course_type, parent_id = fields
-
                 # Insert into database
                 try:
-                    cursor.execute("""
-                        INSERT INTO Courses (id, courseCode, courseName, instructor, time, days, type, parentID)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (course_id, course_code, course_name, instructor, time, days, course_type, parent_id))
+                    cursor.execute(INSERT_COURSE.format(action="INSERT", table="Courses"), row)
                 except sqlite3.IntegrityError as e:
                     print(f"Skipping duplicate or invalid row {line_number}: {e}")
 
+        # Build the listing indexes after the bulk insert rather than maintaining them row by row
+        for statement in COURSE_INDEXES:
+            cursor.execute(statement)
+
+        # Normalize the slash-joined parentID field into an indexed link table
+        rebuild_section_parents(cursor)
+
+        # Set dangling links aside and precompute each lecture's required child types
+        integrity = catalog_integrity.precompute(cursor)
+        print(f"Catalog integrity: {catalog_integrity.format_summary(integrity)}.")
+
+        # Keep the full-text search index in sync with the new catalog
+        rebuild_search_index(cursor)
+
+        # Create the per-user schedule tables, or migrate an older shared Schedule
+        ensure_schedule_schema(cursor)
+
+        version = bump_catalog_version(cursor)
         conn.commit()
-        print("Data imported successfully.")
+        print(f"Data imported successfully (catalog version {version}).")
+
+        # Workers build the catalog faster from this snapshot than by querying Courses
+        write_snapshot(conn, snapshot_path(DATABASE), version)
     except sqlite3.Error as e:
         print(f"Database error: {e}")
     finally:
         conn.close()
 
+def incremental_import(database=DATABASE, dataset_path=DATASET_PATH, chunk_size=CHUNK_SIZE, progress=None):
+    """Bring Courses in line with the dataset, touching only rows that changed.
+
+    The dataset is streamed into a temporary staging table with executemany
+    before the write lock is taken, so other writers only wait while it is
+    diffed against Courses by id and applied together with the derived
+    tables and the catalog version bump in a single transaction. Readers
+    keep seeing the previous catalog until that transaction commits.
+
+    ``progress``, if given, is called with a fraction done and a message as
+    the import moves through its stages.
+
+    Returns a dict of row counts and timings.
+    """
+    def report(fraction, message):
+        if progress is not None:
+            progress(fraction, message)
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(database, isolation_level=None)
+    cursor = conn.cursor()
+    for pragma in IMPORT_PRAGMAS:
+        cursor.execute(pragma)
+
+    try:
+        # Stream the dataset into staging; the first row for a duplicate id wins
+        cursor.execute("DROP TABLE IF EXISTS temp.CoursesStaging")
+        cursor.execute(SCHEMA.format(table="temp.CoursesStaging"))
+        rows_read = 0
+        for chunk in read_dataset(dataset_path, chunk_size):
+            cursor.executemany(INSERT_COURSE.format(action="INSERT OR IGNORE", table="temp.CoursesStaging"), chunk)
+            rows_read += len(chunk)
+            report(0.0, f"Staged {rows_read} rows")
+        staged = cursor.execute("SELECT COUNT(*) FROM temp.CoursesStaging").fetchone()[0]
+
+        report(0.5, "Waiting for the write lock")
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(SCHEMA.format(table="Courses"))
+        ensure_course_columns(cursor)
+        for statement in COURSE_INDEXES:
+            cursor.execute(statement)
+        cursor.execute(PARENTS_SCHEMA)
+        cursor.execute(PARENTS_INDEX)
+        # An index from before search was keyed by section id is rebuilt rather than patched
+        search_outdated = not search_index_current(cursor)
+        # A catalog imported before the integrity tables existed needs them filled in even if no row changed
+        integrity_missing = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'LectureChildTypes'"
+        ).fetchone() is None
+        catalog_integrity.ensure_schema(cursor)
+
+        # Diff by id: rows to delete, and rows to insert or update
+        cursor.execute("DROP TABLE IF EXISTS temp.ChangedCourses")
+        cursor.execute("CREATE TEMP TABLE ChangedCourses (id TEXT PRIMARY KEY, change TEXT)")
+        cursor.execute("""
+            INSERT INTO temp.ChangedCourses (id, change)
+            SELECT c.id, 'delete' FROM Courses c
+            WHERE NOT EXISTS (SELECT 1 FROM temp.CoursesStaging s WHERE s.id = c.id)
+        """)
+        cursor.execute(f"""
+            INSERT INTO temp.ChangedCourses (id, change)
+            SELECT s.id, CASE WHEN c.id IS NULL THEN 'insert' ELSE 'update' END
+            FROM temp.CoursesStaging s
+            LEFT JOIN Courses c ON c.id = s.id
+            WHERE c.id IS NULL OR {" OR ".join(f"c.{column} IS NOT s.{column}" for column in COURSE_COLUMNS[1:])}
+        """)
+        counts = dict(cursor.execute("SELECT change, COUNT(*) FROM temp.ChangedCourses GROUP BY change").fetchall())
+        report(0.6, f"Applying {sum(counts.values())} changed rows")
+
+        if counts or integrity_missing:
+            changed_ids = [row[0] for row in cursor.execute("SELECT id FROM temp.ChangedCourses")]
+            if not search_outdated:
+                delete_search_rows(cursor, changed_ids)
+
+            cursor.execute("""
+                DELETE FROM Courses
+                WHERE id IN (SELECT id FROM temp.ChangedCourses WHERE change = 'delete')
+            """)
+            cursor.execute(f"""
+                INSERT INTO Courses ({", ".join(COURSE_COLUMNS)})
+                SELECT {", ".join(f"s.{column}" for column in COURSE_COLUMNS)}
+                FROM temp.CoursesStaging s
+                JOIN temp.ChangedCourses ch ON ch.id = s.id AND ch.change != 'delete'
+                WHERE true
+                ON CONFLICT (id) DO UPDATE SET
+                    {", ".join(f"{column} = excluded.{column}" for column in COURSE_COLUMNS[1:])}
+            """)
+
+            sync_section_parents(cursor, changed_ids)
+            # Changed parents can resolve or strand links of unchanged children too
+            catalog_integrity.precompute(cursor)
+            if not search_outdated:
+                index_search_rows(cursor, cursor.execute("""
+                    SELECT c.id, c.courseCode, c.courseName, c.instructor
+                    FROM Courses c
+                    JOIN temp.ChangedCourses ch ON ch.id = c.id
+                """).fetchall())
+
+            version = bump_catalog_version(cursor)
+        else:
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if search_outdated:
+            rebuild_search_index(cursor)
+        integrity = catalog_integrity.summary(cursor)
+
+        cursor.execute("COMMIT")
+
+        # Workers build the catalog faster from this snapshot than by querying Courses
+        report(0.9, f"Writing the catalog snapshot for version {version}")
+        write_snapshot(conn, snapshot_path(database), version)
+    except BaseException:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        'rows_read': rows_read,
+        'duplicates': rows_read - staged,
+        'inserted': counts.get('insert', 0),
+        'updated': counts.get('update', 0),
+        'deleted': counts.get('delete', 0),
+        'unchanged': staged - counts.get('insert', 0) - counts.get('update', 0),
+        'version': version,
+        'integrity': integrity,
+        'seconds': elapsed,
+        'rows_per_second': rows_read / elapsed if elapsed else 0.0,
+    }
+    return stats
+
 if __name__ == "__main__":
-    clear_and_import_data()
+    parser = argparse.ArgumentParser(description="Import Classes.txt into the Courses table.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="diff against the current catalog and apply only the changes")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="rows per executemany batch in incremental mode")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="path to the Classes.txt dataset")
+    args = parser.parse_args()
+
+    if args.incremental:
+        stats = incremental_import(dataset_path=args.dataset, chunk_size=args.chunk_size)
+        print(
+            f"Imported {stats['rows_read']} rows in {stats['seconds']:.2f}s "
+            f"({stats['rows_per_second']:,.0f} rows/sec): {stats['inserted']} inserted, "
+            f"{stats['updated']} updated, {stats['deleted']} deleted, {stats['unchanged']} unchanged "
+            f"(catalog version {stats['version']})."
+        )
+        print(f"Catalog integrity: {catalog_integrity.format_summary(stats['integrity'])}.")
+    else:
+        DATASET_PATH = args.dataset
+        clear_and_import_data()
@@ -0,0 +1,241 @@
+"""Pooled SQLite connections scoped to the Flask request.
+
+Read-only connections for GET routes come from a bounded pool; writes go
+through a single writer connection so requests queue in-process instead of
+fighting over SQLite's write lock. Every connection runs in WAL mode so
+readers never block on the writer, and keeps a prepared-statement cache.
+"""
+import queue
+import sqlite3
+import threading
+import time
+
+from flask import g, has_app_context
+
+READER_POOL_SIZE = 8
+WRITER_POOL_SIZE = 1
+CACHED_STATEMENTS = 256
+ACQUIRE_TIMEOUT = 10.0  # Seconds to wait for a free connection
+BUSY_TIMEOUT = 5.0  # Seconds SQLite waits on a locked database
+
+
+class PoolExhausted(sqlite3.OperationalError):
+    """Raised when no pooled connection frees up within ACQUIRE_TIMEOUT."""
+
+
+class PooledConnection(sqlite3.Connection):
+    """A connection whose close() hands it back to its pool instead of closing it."""
+
+    pool = None
+    leased = False
+    lease = 0  # Bumped on every acquire so a stale holder can't release someone else's lease
+    on_execute = None  # Optional callable told how many seconds each execute() took
+
+    def execute(self, sql, parameters=()):
+        if self.on_execute is None:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.on_execute(time.perf_counter() - started)
+
+    def executemany(self, sql, parameters):
+        if self.on_execute is None:
+            return super().executemany(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            self.on_execute(time.perf_counter() - started)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+    def discard(self):
+        """Really close the underlying SQLite connection."""
+        sqlite3.Connection.close(self)
+
+
+class ConnectionPool:
+    """A bounded pool of connections to one database, all read-only or all writable."""
+
+    def __init__(self, database, readonly, size):
+        self.database = database
+        self.readonly = readonly
+        self.size = size
+        self._idle = queue.LifoQueue()  # LIFO keeps recently used connections and their caches warm
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.database,
+            factory=PooledConnection,
+            timeout=BUSY_TIMEOUT,
+            check_same_thread=False,  # Connections move between request threads, one at a time
+            cached_statements=CACHED_STATEMENTS,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        if self.readonly:
+            conn.execute('PRAGMA query_only = ON')
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        """Lease a connection, opening one if the pool isn't full yet."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._connect()
+                except sqlite3.Error:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=ACQUIRE_TIMEOUT)
+                except queue.Empty:
+                    raise PoolExhausted(f"No free connection to {self.database} after {ACQUIRE_TIMEOUT}s") from None
+                finally:
+                    with self._lock:
+                        self._waits += 1
+                        self._wait_seconds += time.perf_counter() - started
+
+        with self._lock:
+            conn.leased = True
+            conn.lease += 1
+            self._in_use += 1
+            self._acquired += 1
+        return conn
+
+    def release(self, conn, lease=None):
+        """Return a leased connection, rolling back anything left uncommitted.
+
+        With ``lease`` given, the connection is only released if it is still
+        on that lease, i.e. it wasn't already returned and handed to another
+        request.
+        """
+        with self._lock:
+            if not conn.leased or (lease is not None and conn.lease != lease):
+                return
+            conn.leased = False
+        if conn.on_execute is not None:
+            # Drop the instrumentation the request attached
+            conn.set_trace_callback(None)
+            conn.on_execute = None
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # A broken connection is dropped rather than handed to the next request
+            conn.discard()
+            with self._lock:
+                self._created -= 1
+                self._in_use -= 1
+            return
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    def close_all(self):
+        """Close every idle connection in the pool."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.discard()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self):
+        """Return a snapshot of this pool's usage counters."""
+        with self._lock:
+            return {
+                'database': self.database,
+                'readonly': self.readonly,
+                'size': self.size,
+                'open': self._created,
+                'inUse': self._in_use,
+                'idle': self._created - self._in_use,
+                'acquired': self._acquired,
+                'waits': self._waits,
+                'waitSeconds': round(self._wait_seconds, 6),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database, readonly):
+    """Return the shared pool for a database, creating it on first use."""
+    key = (database, readonly)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(database, readonly, READER_POOL_SIZE if readonly else WRITER_POOL_SIZE)
+                _pools[key] = pool
+    return pool
+
+
+def get_connection(database, readonly=False):
+    """Lease a connection for the current request, reusing one already leased.
+
+    Outside a Flask app context the caller owns the connection and must
+    close() it, which returns it to the pool.
+    """
+    if not has_app_context():
+        return get_pool(database, readonly).acquire()
+
+    key = ('db_reader' if readonly else 'db_writer', database)
+    leased = g.setdefault('db_connections', {})
+    conn, lease = leased.get(key, (None, None))
+    if conn is None or not conn.leased or conn.lease != lease:
+        conn = get_pool(database, readonly).acquire()
+        leased[key] = (conn, conn.lease)
+    return conn
+
+
+def release_request_connections(exception=None):
+    """Teardown hook: hand every connection the request leased back to its pool."""
+    leased = g.pop('db_connections', {})
+    for conn, lease in leased.values():
+        # Routes may have closed theirs already; only release leases this request still holds
+        conn.pool.release(conn, lease)
+
+
+def pool_stats():
+    """Return usage counters for every pool."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
+
+
+def close_pools():
+    """Close every idle pooled connection, e.g. before replacing the database file."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
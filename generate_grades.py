@@ -1,9 +1,16 @@
+import argparse
 import sqlite3
 import random
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import gradestore
+from gradestore import refresh_grades
 
 DATABASE = "courses.db"
 OUTPUT_DIR = "grades"
+SYNTHETIC_DATABASE = "grades.db"  # Default --format sqlite output, kept apart from the live catalog
 
 # Define grade probabilities
 GRADE_DISTRIBUTION = {
@@ -57,7 +64,150 @@ def write_grade_distributions():
         
         print(f"Grades for {course_code} by {instructor} written to {file_name}")
 
+    # Re-ingest only the files that changed into the grade store
+    refresh_grades(conn, OUTPUT_DIR)
     conn.close()
 
+def fetch_lectures():
+    """Return the distinct (courseCode, instructor) pairs that get grade files."""
+    conn = sqlite3.connect(DATABASE)
+    try:
+        return conn.execute("""
+            SELECT DISTINCT courseCode, instructor
+            FROM Courses
+            WHERE type = 'Lecture'
+        """).fetchall()
+    finally:
+        conn.close()
+
+def grade_file_name(course_code, instructor):
+    return f"{course_code.replace('-', '_')}_{instructor.replace(' ', '_')}"
+
+def _generate_course(task):
+    """Worker: draw one lecture's grades with NumPy and write or return them."""
+    import numpy as np
+
+    file_name, seed_seq, students_min, students_max, output_format, output_dir = task
+    rng = np.random.default_rng(seed_seq)
+    weights = np.array(list(GRADE_DISTRIBUTION.values()), dtype=np.float64)
+    probabilities = weights / weights.sum()
+    num_students = int(rng.integers(students_min, students_max, endpoint=True))
+
+    if output_format == "sqlite":
+        # Only the counts are stored, so one multinomial draw replaces per-student sampling
+        return file_name, rng.multinomial(num_students, probabilities), num_students
+
+    codes = rng.choice(len(probabilities), size=num_students, p=probabilities).astype(np.uint8)
+    if output_format == "text":
+        letters = np.array(list(GRADE_DISTRIBUTION))[codes]
+        with open(os.path.join(output_dir, f"{file_name}.txt"), "w") as file:
+            file.write("\n".join(letters.tolist()))
+        return file_name, None, num_students
+    return file_name, codes, num_students
+
+def bulk_generate(seed=None, workers=None, output_format="text", output=None,
+                  students_min=20, students_max=100):
+    """Generate grade distributions for every lecture with NumPy across a process pool.
+
+    ``output_format`` is "text" (the grades/*.txt layout), "npz" (one
+    compressed archive of uint8 grade codes with per-file offsets) or
+    "sqlite" (counts written straight into the grade store tables of the
+    ``output`` database, SYNTHETIC_DATABASE unless given). A fixed seed gives the same grades regardless of
+    the number of workers.
+    """
+    import numpy as np
+
+    started = time.perf_counter()
+    lectures = fetch_lectures()
+    seeds = np.random.SeedSequence(seed).spawn(len(lectures))
+    output_dir = output or OUTPUT_DIR
+    if output_format == "text":
+        os.makedirs(output_dir, exist_ok=True)
+
+    tasks = [
+        (grade_file_name(course_code, instructor), seed_seq, students_min, students_max, output_format, output_dir)
+        for (course_code, instructor), seed_seq in zip(lectures, seeds)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_generate_course, tasks, chunksize=max(1, len(tasks) // 64)))
+
+    total = sum(num_students for _, _, num_students in results)
+    if output_format == "npz":
+        path = output or os.path.join(OUTPUT_DIR, "grades.npz")
+        codes = [result for _, result, _ in results]
+        np.savez_compressed(
+            path,
+            names=np.array([file_name for file_name, _, _ in results]),
+            offsets=np.cumsum([0] + [len(c) for c in codes]),
+            codes=np.concatenate(codes) if codes else np.zeros(0, dtype=np.uint8),
+            grades=np.array(list(GRADE_DISTRIBUTION)),
+        )
+    elif output_format == "sqlite":
+        write_grade_store(output or SYNTHETIC_DATABASE, results)
+    elif output_dir == OUTPUT_DIR:
+        conn = sqlite3.connect(DATABASE)
+        try:
+            refresh_grades(conn, OUTPUT_DIR)
+        finally:
+            conn.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Generated {total:,} grades for {len(results)} lectures in {elapsed:.2f}s "
+          f"({total / elapsed:,.0f} grades/sec, format={output_format}).")
+    return total
+
+def write_grade_store(database, results):
+    """Write multinomial grade counts directly into the grade store tables.
+
+    The rows have no backing file, so they are tagged with
+    ``gradestore.SYNTHETIC_MTIME`` and later refreshes don't delete them.
+    """
+    conn = sqlite3.connect(database)
+    try:
+        gradestore.ensure_schema(conn)
+        letters = list(GRADE_DISTRIBUTION)
+        for file_name, counts, total in results:
+            grade_counts = dict(zip(letters, counts.tolist()))
+            points = sum(gradestore.GRADE_TO_NUMERIC[grade] * count for grade, count in grade_counts.items())
+            average_gpa = round(points / total, 2) if total else 0.0
+            course_code, instructor = gradestore.parse_file_name(file_name)
+            conn.execute("""
+                INSERT OR REPLACE INTO GradeFiles
+                    (fileName, courseCode, instructor, mtimeNs, size, total, meanGPA, letterAverage)
+                VALUES (?, ?, ?, ?, 0, ?, ?, ?)
+            """, (file_name, course_code, instructor, gradestore.SYNTHETIC_MTIME, total, average_gpa,
+                  gradestore.gpa_to_letter_grade(average_gpa)))
+            conn.executemany(
+                "INSERT OR REPLACE INTO GradeCounts (fileName, grade, count) VALUES (?, ?, ?)",
+                ((file_name, grade, count) for grade, count in grade_counts.items())
+            )
+        conn.execute("DELETE FROM CourseGradeCounts")
+        conn.execute("""
+            INSERT INTO CourseGradeCounts (courseCode, grade, count)
+            SELECT f.courseCode, g.grade, SUM(g.count)
+            FROM GradeFiles f
+            JOIN GradeCounts g ON g.fileName = f.fileName
+            GROUP BY f.courseCode, g.grade
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+
 if __name__ == "__main__":
-    write_grade_distributions()
+    parser = argparse.ArgumentParser(description="Generate random grade distributions for every lecture.")
+    parser.add_argument("--bulk", action="store_true", help="vectorized NumPy generation across a process pool")
+    parser.add_argument("--seed", type=int, help="random seed for reproducible output (bulk mode)")
+    parser.add_argument("--workers", type=int, help="number of worker processes (bulk mode)")
+    parser.add_argument("--format", choices=("text", "npz", "sqlite"), default="text",
+                        help="output format (bulk mode)")
+    parser.add_argument("--output", help=f"output directory, .npz path or SQLite database "
+                                          f"(bulk mode; sqlite defaults to {SYNTHETIC_DATABASE})")
+    parser.add_argument("--students-min", type=int, default=20, help="fewest students per lecture (bulk mode)")
+    parser.add_argument("--students-max", type=int, default=100, help="most students per lecture (bulk mode)")
+    args = parser.parse_args()
+
+    if args.bulk:
+        bulk_generate(seed=args.seed, workers=args.workers, output_format=args.format, output=args.output,
+                      students_min=args.students_min, students_max=args.students_max)
+    else:
+        write_grade_distributions()
@@ -0,0 +1,211 @@
+"""Cross-instructor grade analytics computed with NumPy.
+
+Every grades/*.txt file is parsed into an array of uint8 grade codes, in
+parallel when there are many files. The process pool is created once and
+starts its workers with the spawn method, since forking a multithreaded
+web server process can deadlock the children. The arrays are
+concatenated once and every statistic is computed for all files at the
+same time: per-course pooled distributions with ``bincount``, per-file
+(i.e. per-instructor) mean and standard deviation from weighted sums, and
+medians and percentiles from one lexsort by (file, GPA). Instructors are
+ranked within each course by mean GPA, then median.
+
+Results are cached against the directory's file names, mtimes and sizes.
+Request handlers only read the cache through ``peek_analytics``; the
+recomputation runs in a background job (``jobs.refresh_analytics``), so a
+request never pays for parsing the files.
+"""
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from gradestore import GRADES_DIR, GRADE_TO_NUMERIC, LETTER_GRADES, LETTER_THRESHOLDS, parse_file_name
+
+GRADES = tuple(GRADE_TO_NUMERIC)
+GRADE_CODES = {grade: code for code, grade in enumerate(GRADES)}
+GPA_BY_CODE = np.array([GRADE_TO_NUMERIC[grade] for grade in GRADES])
+PERCENTILES = (10, 25, 75, 90)
+PARALLEL_MIN_FILES = 64  # Below this, a process pool costs more than it saves
+
+
+def load_grade_file(path):
+    """Parse one grade file into an array of grade codes, skipping unknown lines."""
+    with open(path, 'r') as file:
+        codes = [GRADE_CODES.get(line.strip()) for line in file]
+    return np.array([code for code in codes if code is not None], dtype=np.uint8)
+
+
+def directory_signature(directory=GRADES_DIR):
+    """List ``(name, mtime_ns, size)`` for every grade file, sorted by name."""
+    return sorted(
+        (entry.name[:-len('.txt')], entry.stat().st_mtime_ns, entry.stat().st_size)
+        for entry in os.scandir(directory)
+        if entry.name.endswith('.txt') and entry.is_file()
+    )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers=None):
+    """Return this process's spawn-method worker pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def reset_pool(pool):
+    """Forget a pool whose worker died so the next call starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def load_grade_codes(directory=GRADES_DIR, file_names=None, workers=None):
+    """Load every grade file into ``{file_name: codes}``, in parallel for large directories."""
+    if file_names is None:
+        file_names = [name for name, _, _ in directory_signature(directory)]
+    paths = [os.path.join(directory, f"{name}.txt") for name in file_names]
+    if workers == 1 or len(paths) < PARALLEL_MIN_FILES:
+        arrays = [load_grade_file(path) for path in paths]
+    else:
+        pool = get_pool(workers)
+        try:
+            arrays = list(pool.map(load_grade_file, paths, chunksize=max(1, len(paths) // 64)))
+        except BrokenProcessPool:
+            reset_pool(pool)
+            raise
+    return dict(zip(file_names, arrays))
+
+
+def _quantiles(sorted_gpa, starts, counts, q):
+    """Linearly interpolated quantile q of every segment of an array sorted per segment."""
+    position = starts + q * np.maximum(counts - 1, 0)
+    low = np.floor(position).astype(np.int64)
+    high = np.minimum(low + 1, starts + np.maximum(counts - 1, 0))
+    fraction = position - low
+    return sorted_gpa[low] * (1 - fraction) + sorted_gpa[high] * fraction
+
+
+def compute_analytics(codes_by_file):
+    """Compute pooled course distributions and per-instructor statistics and rankings.
+
+    Returns ``{courseCode: {...}}`` with each course's pooled grade counts,
+    mean GPA and letter average, and its instructors ordered by rank.
+    """
+    files = [name for name, codes in codes_by_file.items() if len(codes)]
+    if not files:
+        return {}
+    parsed = [parse_file_name(name) for name in files]
+    course_codes = sorted({course for course, _ in parsed})
+    course_index = {course: index for index, course in enumerate(course_codes)}
+    file_course = np.array([course_index[course] for course, _ in parsed])
+
+    arrays = [codes_by_file[name] for name in files]
+    counts = np.array([len(codes) for codes in arrays])
+    codes = np.concatenate(arrays)
+    segment = np.repeat(np.arange(len(files)), counts)
+    gpa = GPA_BY_CODE[codes]
+
+    # Pooled distribution per course: one bincount over (course, grade) pairs
+    course_of_grade = file_course[segment]
+    distribution = np.bincount(
+        course_of_grade * len(GRADES) + codes, minlength=len(course_codes) * len(GRADES)
+    ).reshape(len(course_codes), len(GRADES))
+    course_students = distribution.sum(axis=1)
+    course_mean = distribution @ GPA_BY_CODE / course_students
+
+    # Per-file moments from weighted sums
+    mean = np.bincount(segment, weights=gpa, minlength=len(files)) / counts
+    mean_square = np.bincount(segment, weights=gpa * gpa, minlength=len(files)) / counts
+    std = np.sqrt(np.maximum(mean_square - mean * mean, 0.0))
+
+    # Medians and percentiles from one sort by (file, gpa)
+    sorted_gpa = gpa[np.lexsort((gpa, segment))]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    median = _quantiles(sorted_gpa, starts, counts, 0.5)
+    percentiles = {p: _quantiles(sorted_gpa, starts, counts, p / 100) for p in PERCENTILES}
+
+    # Rank instructors within each course: highest mean first, then highest median
+    order = np.lexsort((-median, -mean, file_course))
+    first_in_course = np.searchsorted(file_course[order], np.arange(len(course_codes)))
+    rank = np.empty(len(files), dtype=np.int64)
+    rank[order] = np.arange(len(files)) - first_in_course[file_course[order]] + 1
+
+    letter = np.array(LETTER_GRADES)[np.searchsorted(LETTER_THRESHOLDS, np.round(mean, 2), side='right')]
+    course_letter = np.array(LETTER_GRADES)[
+        np.searchsorted(LETTER_THRESHOLDS, np.round(course_mean, 2), side='right')
+    ]
+
+    analytics = {
+        course: {
+            'courseCode': course,
+            'students': int(course_students[index]),
+            'distribution': dict(zip(GRADES, distribution[index].tolist())),
+            'meanGPA': round(float(course_mean[index]), 3),
+            'letterAverage': str(course_letter[index]),
+            'instructors': [],
+        }
+        for index, course in enumerate(course_codes)
+    }
+    for position in order:
+        course, instructor = parsed[position]
+        analytics[course]['instructors'].append({
+            'instructor': instructor,
+            'fileName': files[position],
+            'rank': int(rank[position]),
+            'students': int(counts[position]),
+            'mean': round(float(mean[position]), 3),
+            'median': round(float(median[position]), 3),
+            'std': round(float(std[position]), 3),
+            'percentiles': {f"p{p}": round(float(values[position]), 3) for p, values in percentiles.items()},
+            'letterAverage': str(letter[position]),
+        })
+    return analytics
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def signature_etag(signature):
+    return hashlib.sha1(repr(signature).encode()).hexdigest()[:16]
+
+
+def peek_analytics(directory=GRADES_DIR):
+    """Return ``(etag, analytics, current)`` from the cache without computing anything.
+
+    ``current`` is False when files changed since the cached result was
+    computed. Returns None if nothing has been computed for directory yet.
+    """
+    cached = _cache.get(directory)
+    if cached is None:
+        return None
+    return cached[0], cached[1], cached[0] == signature_etag(directory_signature(directory))
+
+
+def get_analytics(directory=GRADES_DIR, workers=None):
+    """Return ``(etag, analytics)`` for a grades directory, recomputing only if files changed."""
+    signature = directory_signature(directory)
+    etag = signature_etag(signature)
+    cached = _cache.get(directory)
+    if cached is not None and cached[0] == etag:
+        return cached
+
+    # One request recomputes while concurrent ones wait for its result
+    with _cache_lock:
+        cached = _cache.get(directory)
+        if cached is None or cached[0] != etag:
+            codes_by_file = load_grade_codes(directory, [name for name, _, _ in signature], workers)
+            cached = _cache[directory] = (etag, compute_analytics(codes_by_file))
+    return cached
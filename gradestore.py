@@ -0,0 +1,243 @@
+"""Materialized grade statistics loaded from the grades/*.txt files.
+
+Each file holds one letter grade per line for a course/instructor pair and
+is named like ``CSCI_104_John_Smith.txt``. Refreshing only re-reads files
+whose mtime or size changed, and stores their counts and precomputed
+aggregates so the /grades route reads a single indexed row. Each refresh
+also records the directory's mtime, which changes whenever a file is
+added, removed or replaced by rename. The route compares it with one
+``stat`` and starts a background ``grades`` job when it moved; edits made
+in place leave it alone, so they are picked up by running that job or
+``python gradestore.py``.
+"""
+import os
+import sqlite3
+from bisect import bisect_right
+
+DATABASE = "courses.db"
+GRADES_DIR = "grades"
+
+# mtimeNs of rows written without a backing file (generate_grades.py --format sqlite);
+# refreshes leave them alone unless a real file with the same name appears
+SYNTHETIC_MTIME = -1
+
+GRADE_TO_NUMERIC = {
+    'A': 4.0, 'A-': 3.7, 'B+': 3.3, 'B': 3.0, 'B-': 2.7,
+    'C+': 2.3, 'C': 2.0, 'C-': 1.7, 'D+': 1.3, 'D': 1.0, 'F': 0.0
+}
+
+# Lowest GPA that earns each letter above F; LETTER_GRADES[i] covers GPAs from
+# LETTER_THRESHOLDS[i - 1] up to, but not including, LETTER_THRESHOLDS[i]
+LETTER_THRESHOLDS = (0.85, 1.15, 1.50, 1.85, 2.15, 2.50, 2.85, 3.15, 3.50, 3.85)
+LETTER_GRADES = ('F', 'D', 'D+', 'C-', 'C', 'C+', 'B-', 'B', 'B+', 'A-', 'A')
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS GradeFiles (
+        fileName TEXT PRIMARY KEY,
+        courseCode TEXT NOT NULL,
+        instructor TEXT NOT NULL,
+        mtimeNs INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        total INTEGER NOT NULL,
+        meanGPA REAL NOT NULL,
+        letterAverage TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_grade_files_course ON GradeFiles (courseCode, instructor)",
+    """
+    CREATE TABLE IF NOT EXISTS GradeCounts (
+        fileName TEXT NOT NULL,
+        grade TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (fileName, grade)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS GradeDirectories (
+        directory TEXT PRIMARY KEY,
+        mtimeNs INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS CourseGradeCounts (
+        courseCode TEXT NOT NULL,
+        grade TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (courseCode, grade)
+    ) WITHOUT ROWID
+    """,
+)
+
+
+def gpa_to_letter_grade(gpa):
+    """Convert a GPA value to a letter grade."""
+    return LETTER_GRADES[bisect_right(LETTER_THRESHOLDS, gpa)]
+
+
+def parse_file_name(file_name):
+    """Split "CSCI_104_John_Smith" into ("CSCI-104", "John Smith")."""
+    parts = file_name.split("_")
+    return "-".join(parts[:2]), " ".join(parts[2:])
+
+
+def summarize_grades(lines):
+    """Count letter grades and compute the mean GPA and its letter equivalent."""
+    grade_counts = {grade: 0 for grade in GRADE_TO_NUMERIC}
+    for line in lines:
+        grade = line.strip()
+        if grade in grade_counts:
+            grade_counts[grade] += 1
+
+    total = sum(grade_counts.values())
+    points = sum(GRADE_TO_NUMERIC[grade] * count for grade, count in grade_counts.items())
+    average_gpa = round(points / total, 2) if total else 0.0
+    return grade_counts, total, average_gpa, gpa_to_letter_grade(average_gpa)
+
+
+def ensure_schema(conn):
+    """Create the grade tables if they don't exist yet."""
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+
+def scan_grade_files(conn, directory=GRADES_DIR):
+    """Compare the grade files on disk with GradeFiles without reading any of them.
+
+    Returns ``(seen, changed, removed)``: the names of every file on disk,
+    ``(file_name, path, stat)`` for the new or modified ones, and the names
+    of stored files that are gone.
+    """
+    known = {
+        row[0]: (row[1], row[2])
+        for row in conn.execute('SELECT fileName, mtimeNs, size FROM GradeFiles')
+    }
+    synthetic = {file_name for file_name, (mtime, _) in known.items() if mtime == SYNTHETIC_MTIME}
+
+    seen = set()
+    changed = []
+    for entry in os.scandir(directory):
+        if not entry.name.endswith('.txt') or not entry.is_file():
+            continue
+        file_name = entry.name[:-len('.txt')]
+        seen.add(file_name)
+        stat = entry.stat()
+        if known.get(file_name) != (stat.st_mtime_ns, stat.st_size):
+            changed.append((file_name, entry.path, stat))
+
+    removed = [file_name for file_name in known if file_name not in seen and file_name not in synthetic]
+    return seen, changed, removed
+
+
+def grade_store_stale(conn, directory=GRADES_DIR):
+    """Check whether files were added to or removed from directory since its last refresh.
+
+    Costs one ``stat`` of the directory and one indexed read.
+    """
+    try:
+        mtime = os.stat(directory).st_mtime_ns
+    except OSError:
+        return False
+    if conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'GradeDirectories'"
+    ).fetchone() is None:
+        return True
+    row = conn.execute('SELECT mtimeNs FROM GradeDirectories WHERE directory = ?', (directory,)).fetchone()
+    return row is None or row[0] != mtime
+
+
+def refresh_grades(conn, directory=GRADES_DIR, progress=None):
+    """Re-ingest grade files that were added, changed or removed since the last refresh.
+
+    ``progress``, if given, is called with a fraction done and a message
+    after every file read. Every changed file is read and summarized before
+    the first write, so the database is only locked for the short
+    transaction that applies the results. Returns a dict with the number
+    of files read, removed and left untouched.
+    """
+    ensure_schema(conn)
+    # Taken before the scan, so a file added during it leaves the store marked stale
+    directory_mtime = os.stat(directory).st_mtime_ns
+    seen, changed, removed = scan_grade_files(conn, directory)
+    affected_courses = {parse_file_name(file_name)[0] for file_name in removed}
+
+    summaries = []
+    for index, (file_name, path, stat) in enumerate(changed):
+        if progress is not None:
+            progress(index / len(changed), f"Reading {file_name}")
+        with open(path, 'r') as file:
+            summaries.append((file_name, stat, summarize_grades(file)))
+
+    # The first write below takes the lock; nothing after it touches the filesystem
+    for file_name in removed:
+        conn.execute('DELETE FROM GradeFiles WHERE fileName = ?', (file_name,))
+        conn.execute('DELETE FROM GradeCounts WHERE fileName = ?', (file_name,))
+
+    for file_name, stat, (grade_counts, total, average_gpa, letter) in summaries:
+        course_code, instructor = parse_file_name(file_name)
+        affected_courses.add(course_code)
+
+        conn.execute('''
+            INSERT OR REPLACE INTO GradeFiles
+                (fileName, courseCode, instructor, mtimeNs, size, total, meanGPA, letterAverage)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (file_name, course_code, instructor, stat.st_mtime_ns, stat.st_size, total, average_gpa, letter))
+        conn.executemany(
+            'INSERT OR REPLACE INTO GradeCounts (fileName, grade, count) VALUES (?, ?, ?)',
+            ((file_name, grade, count) for grade, count in grade_counts.items())
+        )
+
+    # Roll the per-instructor counts up into per-course counts for touched courses only
+    for course_code in affected_courses:
+        conn.execute('DELETE FROM CourseGradeCounts WHERE courseCode = ?', (course_code,))
+        conn.execute('''
+            INSERT INTO CourseGradeCounts (courseCode, grade, count)
+            SELECT f.courseCode, g.grade, SUM(g.count)
+            FROM GradeFiles f
+            JOIN GradeCounts g ON g.fileName = f.fileName
+            WHERE f.courseCode = ?
+            GROUP BY f.courseCode, g.grade
+        ''', (course_code,))
+
+    conn.execute(
+        'INSERT OR REPLACE INTO GradeDirectories (directory, mtimeNs) VALUES (?, ?)', (directory, directory_mtime)
+    )
+    conn.commit()
+    return {'read': len(changed), 'removed': len(removed), 'unchanged': len(seen) - len(changed)}
+
+
+def has_grade_store(conn):
+    """Check whether the grade tables have been built yet."""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'GradeFiles'"
+    ).fetchone() is not None
+
+
+def list_grade_files(conn):
+    """Return the names of all ingested grade files."""
+    return [row[0] for row in conn.execute('SELECT fileName FROM GradeFiles ORDER BY fileName')]
+
+
+def get_grade_stats(conn, file_name):
+    """Return ``(grade_counts, letter_average)`` for one file, or None if unknown."""
+    summary = conn.execute(
+        'SELECT letterAverage FROM GradeFiles WHERE fileName = ?', (file_name,)
+    ).fetchone()
+    if summary is None:
+        return None
+
+    counts = dict(conn.execute(
+        'SELECT grade, count FROM GradeCounts WHERE fileName = ?', (file_name,)
+    ).fetchall())
+    grade_counts = {grade: counts.get(grade, 0) for grade in GRADE_TO_NUMERIC}
+    return grade_counts, summary[0]
+
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(DATABASE)
+    try:
+        stats = refresh_grades(conn)
+        print(f"Grade store refreshed: {stats['read']} read, {stats['removed']} removed, "
+              f"{stats['unchanged']} unchanged.")
+    finally:
+        conn.close()
@@ -0,0 +1,212 @@
+"""In-process background jobs for catalog reimports, grade refreshes, analytics and cache warm-up.
+
+Jobs run on a small thread pool so the app keeps answering requests while
+they work. Jobs that write to the database hold the one writer slot: a
+second writer job is refused while one is queued or running, rather than
+stacking up imports behind each other. The reimport stages the dataset
+before taking SQLite's write lock and applies it in one transaction, so
+requests keep reading the previous catalog version until it commits; the
+job then loads the new catalog into this process's cache before it is
+marked done. Grade refreshes likewise read and summarize every changed
+file before their one short write transaction.
+
+Job state only lives in this process; run one job host per database.
+"""
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+import dataimport
+from catalog import get_catalog
+from gradestore import GRADES_DIR, refresh_grades
+
+MAX_WORKERS = 2
+HISTORY_SIZE = 50  # Finished jobs kept for status queries
+
+
+class JobConflict(Exception):
+    """Raised when a writer job is submitted while another one is active."""
+
+    def __init__(self, job):
+        super().__init__(f"{job.kind} job {job.id} is still {job.state}")
+        self.job = job
+
+
+class Job:
+    """One background job and its progress."""
+
+    def __init__(self, kind, writer):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.writer = writer
+        self.state = 'queued'
+        self.progress = 0.0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def active(self):
+        return self.state in ('queued', 'running')
+
+    def report(self, progress, message=''):
+        """Record progress; jobs call this as they work."""
+        self.progress = max(0.0, min(1.0, progress))
+        self.message = message
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'writer': self.writer,
+            'state': self.state,
+            'progress': round(self.progress, 3),
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class JobRunner:
+    """Runs jobs on a thread pool, allowing one writer job at a time."""
+
+    def __init__(self, max_workers=MAX_WORKERS, history=HISTORY_SIZE):
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._writer = None
+
+    def submit(self, kind, func, *args, writer=False):
+        """Queue func(job, *args) and return its Job; raises JobConflict for a second writer."""
+        job = Job(kind, writer)
+        with self._lock:
+            if writer:
+                if self._writer is not None and self._writer.active:
+                    raise JobConflict(self._writer)
+                self._writer = job
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, func, args)
+        return job
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def _run(self, job, func, args):
+        job.state, job.started = 'running', time.time()
+        try:
+            job.result = func(job, *args)
+            job.progress, job.state = 1.0, 'succeeded'
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.state = 'failed'
+            traceback.print_exc()
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_job(self, kind):
+        """Return the queued or running job of kind, if any."""
+        with self._lock:
+            return next((job for job in self._jobs.values() if job.kind == kind and job.active), None)
+
+    def jobs(self):
+        """Return every known job, newest first."""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def warm_caches(job, database, grades_dir=GRADES_DIR):
+    """Load the catalog, its meeting index and the grade analytics into this process's caches."""
+    job.report(0.1, "Loading the catalog")
+    conn = db.get_pool(database, readonly=True).acquire()
+    try:
+        catalog = get_catalog(conn)
+    finally:
+        conn.close()
+    job.report(0.5, f"Indexing catalog version {catalog.version}")
+    catalog.meetings  # Built on first access
+
+    analytics = None
+    if os.path.isdir(grades_dir):
+        job.report(0.7, "Computing grade analytics")
+        try:
+            import grade_analytics  # NumPy is optional outside analytics
+        except ImportError:
+            pass
+        else:
+            analytics = len(grade_analytics.get_analytics(grades_dir)[1])
+    return {'catalogVersion': catalog.version, 'sections': len(catalog), 'analyticsCourses': analytics}
+
+
+def reimport_catalog(job, database, dataset_path=dataimport.DATASET_PATH):
+    """Apply the dataset to the catalog incrementally, then warm the new catalog."""
+    stats = dataimport.incremental_import(
+        database, dataset_path, progress=lambda fraction, message: job.report(fraction * 0.9, message)
+    )
+    job.report(0.9, f"Loading catalog version {stats['version']}")
+    conn = db.get_pool(database, readonly=True).acquire()
+    try:
+        get_catalog(conn)
+    finally:
+        conn.close()
+    stats['seconds'] = round(stats['seconds'], 3)
+    stats['rows_per_second'] = round(stats['rows_per_second'], 1)
+    return stats
+
+
+def reingest_grades(job, database, grades_dir=GRADES_DIR):
+    """Re-read the grade files that changed into the grade store."""
+    # A connection of its own, so requests keep the pooled writer while files are read
+    conn = sqlite3.connect(database, timeout=db.BUSY_TIMEOUT)
+    try:
+        return refresh_grades(conn, grades_dir, progress=job.report)
+    finally:
+        conn.close()
+
+
+def refresh_analytics(job, database, grades_dir=GRADES_DIR):
+    """Recompute the grade analytics that /grades/analytics.json serves from its cache."""
+    import grade_analytics  # NumPy is optional outside analytics
+
+    job.report(0.1, "Computing grade analytics")
+    etag, analytics = grade_analytics.get_analytics(grades_dir)
+    return {'etag': etag, 'analyticsCourses': len(analytics)}
+
+
+# kind -> (function, writes to the database)
+JOB_KINDS = {
+    'reimport': (reimport_catalog, True),
+    'grades': (reingest_grades, True),
+    'analytics': (refresh_analytics, False),
+    'warm': (warm_caches, False),
+}
+
+runner = JobRunner()
+
+
+def start_job(kind, database):
+    """Start a job of a JOB_KINDS kind against database and return it."""
+    func, writer = JOB_KINDS[kind]
+    return runner.submit(kind, func, database, writer=writer)
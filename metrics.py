@@ -0,0 +1,323 @@
+"""Opt-in request metrics served in Prometheus text format.
+
+Set ``COURSE_SCHEDULER_METRICS=1`` to record, per route, request latency,
+the number of SQL statements and the time spent in them, and template
+render time, all as histograms on ``/metrics``. SQL statements are counted
+through each pooled connection's trace callback, which also sees the
+expanded SQL, so a statement that runs again with the same values in one
+request is counted as repeated. ``/metrics/slowest`` lists the slowest
+recent requests with their most repeated statements.
+
+``COURSE_SCHEDULER_PROFILE=1`` additionally runs cProfile on a sample of
+requests and writes a ``.prof`` file whenever a profiled request is among
+the slowest seen so far. Both endpoints expose expanded SQL and timings,
+so they are guarded by the ``authorize`` check given to ``init_app``; the
+app passes its admin-token check.
+"""
+import cProfile
+import collections
+import heapq
+import os
+import random
+import threading
+import time
+
+from flask import abort, before_render_template, g, has_app_context, jsonify, request, template_rendered
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SLOWEST_KEPT = 20
+PROFILE_SAMPLE_RATE = 0.05
+PROFILE_DIR = "profiles"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._values.items())
+        for labels, (counts, total, count) in values:
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', bound)])} {bucket_count}"
+            yield f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', '+Inf')])} {count}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+
+REQUESTS = Counter('scheduler_requests_total', 'Requests handled.', ('route', 'method', 'status'))
+LATENCY = Histogram(
+    'scheduler_request_duration_seconds', 'Request latency.', LATENCY_BUCKETS, ('route', 'method')
+)
+SQL_STATEMENTS = Histogram(
+    'scheduler_request_sql_statements', 'SQL statements run per request.', STATEMENT_BUCKETS, ('route', 'method')
+)
+SQL_REPEATED = Histogram(
+    'scheduler_request_sql_repeated_statements',
+    'SQL statements per request that repeat an earlier statement with the same values.',
+    STATEMENT_BUCKETS, ('route', 'method')
+)
+SQL_SECONDS = Histogram(
+    'scheduler_request_sql_seconds', 'Time spent executing SQL per request.', LATENCY_BUCKETS, ('route', 'method')
+)
+RENDER_SECONDS = Histogram(
+    'scheduler_template_render_seconds', 'Template render time.', LATENCY_BUCKETS, ('template',)
+)
+METRICS = (REQUESTS, LATENCY, SQL_STATEMENTS, SQL_REPEATED, SQL_SECONDS, RENDER_SECONDS)
+
+
+def render_metrics():
+    """Format every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+class RequestStats:
+    """SQL and render counters for the request in progress."""
+
+    __slots__ = (
+        'started', 'statements', 'sql_seconds', 'render_seconds', 'render_started', 'profiler', 'profiler_running',
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = collections.Counter()
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        self.render_started = None
+        self.profiler = None
+        self.profiler_running = False
+
+    def statement(self, sql):
+        self.statements[sql] += 1
+
+    def executed(self, seconds):
+        self.sql_seconds += seconds
+
+
+class SlowestRequests:
+    """The slowest requests seen so far, kept in a bounded min-heap."""
+
+    def __init__(self, size=SLOWEST_KEPT):
+        self.size = size
+        self._heap = []
+        self._lock = threading.Lock()
+        self._sequence = 0
+
+    def would_keep(self, seconds):
+        with self._lock:
+            return len(self._heap) < self.size or seconds > self._heap[0][0]
+
+    def add(self, seconds, entry):
+        with self._lock:
+            self._sequence += 1
+            item = (seconds, self._sequence, entry)
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            elif seconds > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def entries(self):
+        with self._lock:
+            return [entry for _, _, entry in sorted(self._heap, reverse=True)]
+
+
+slowest = SlowestRequests()
+_profiling = False
+_profile_lock = threading.Lock()  # cProfile can only run one profiler at a time
+
+
+def instrument(conn):
+    """Attach the current request's SQL counters to a pooled connection."""
+    if not has_app_context():
+        return conn
+    stats = g.get('request_stats')
+    if stats is not None and conn.on_execute is None:
+        conn.set_trace_callback(stats.statement)
+        conn.on_execute = stats.executed
+    return conn
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _before_request():
+    g.request_stats = stats = RequestStats()
+    if _profiling and random.random() < PROFILE_SAMPLE_RATE and _profile_lock.acquire(blocking=False):
+        stats.profiler = cProfile.Profile()
+        stats.profiler.enable()
+        stats.profiler_running = True
+
+
+def _stop_profiler(stats):
+    if stats.profiler is not None and stats.profiler_running:
+        stats.profiler.disable()
+        stats.profiler_running = False
+        _profile_lock.release()
+
+
+def _after_request(response):
+    stats = g.get('request_stats')
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - stats.started
+    _stop_profiler(stats)
+
+    route, method = _route(), request.method
+    statement_count = sum(stats.statements.values())
+    repeated = statement_count - len(stats.statements)
+    REQUESTS.inc((route, method, response.status_code))
+    LATENCY.observe((route, method), elapsed)
+    SQL_STATEMENTS.observe((route, method), statement_count)
+    SQL_REPEATED.observe((route, method), repeated)
+    SQL_SECONDS.observe((route, method), stats.sql_seconds)
+
+    if slowest.would_keep(elapsed):
+        entry = {
+            'route': route,
+            'method': method,
+            'path': request.full_path.rstrip('?'),
+            'status': response.status_code,
+            'seconds': round(elapsed, 6),
+            'sqlStatements': statement_count,
+            'sqlRepeated': repeated,
+            'sqlSeconds': round(stats.sql_seconds, 6),
+            'renderSeconds': round(stats.render_seconds, 6),
+            'topStatements': [
+                {'sql': sql, 'count': count} for sql, count in stats.statements.most_common(5)
+            ],
+        }
+        if stats.profiler is not None:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(
+                PROFILE_DIR, f"{int(elapsed * 1e6):010d}us-{request.endpoint or 'unmatched'}-{time.time_ns()}.prof"
+            )
+            stats.profiler.dump_stats(path)
+            entry['profile'] = path
+        slowest.add(elapsed, entry)
+    return response
+
+
+def _teardown_request(exception=None):
+    # A request that raised never reached after_request; don't leave the profiler running
+    stats = g.pop('request_stats', None)
+    if stats is not None:
+        _stop_profiler(stats)
+
+
+def _render_started(sender, template, context, **extra):
+    stats = g.get('request_stats')
+    if stats is not None:
+        stats.render_started = time.perf_counter()
+
+
+def _render_finished(sender, template, context, **extra):
+    stats = g.get('request_stats')
+    if stats is not None and stats.render_started is not None:
+        seconds = time.perf_counter() - stats.render_started
+        stats.render_seconds += seconds
+        stats.render_started = None
+        RENDER_SECONDS.observe((template.name or 'string',), seconds)
+
+
+def init_app(app, profile=False, authorize=None):
+    """Start recording metrics for app and serve them on /metrics.
+
+    Call it before registering other request hooks so requests are timed
+    from the start. ``authorize`` is called before either endpoint answers
+    and should abort unauthorized requests; without it both answer 404.
+    """
+    def _authorize():
+        if authorize is None:
+            abort(404)
+        authorize()
+
+    global _profiling
+    _profiling = profile
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus metrics for this process."""
+        _authorize()
+        return render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    @app.route('/metrics/slowest')
+    def slowest_requests():
+        """The slowest requests recorded by this process."""
+        _authorize()
+        return jsonify(requests=slowest.entries())
+
+
+def enabled():
+    """Check whether metrics were switched on through the environment."""
+    return os.environ.get('COURSE_SCHEDULER_METRICS') == '1'
+
+
+def profiling_enabled():
+    """Check whether request profiling was switched on through the environment."""
+    return os.environ.get('COURSE_SCHEDULER_PROFILE') == '1'
@@ -0,0 +1,94 @@
+"""Validate a batch of schedule additions and removals as one set.
+
+The whole resulting schedule is checked at once against the catalog cache:
+every id must exist, child sections need a parent lecture, each course may
+hold one lecture and one section per child type, and no two sections may
+overlap in time. Errors are returned as structured dicts so the caller can
+reject the batch without writing anything.
+"""
+from collections import Counter
+
+from catalog import CHILD_TYPES
+from conflicts import find_conflicts, row_meeting
+
+
+def _error(code, message, sections):
+    return {'code': code, 'message': message, 'sections': sorted(sections)}
+
+
+def validate_batch(catalog, scheduled_ids, add_ids, drop_ids):
+    """Check that applying the batch leaves a valid schedule.
+
+    ``scheduled_ids`` are the section ids currently on the schedule. Returns
+    a list of error dicts, empty when the batch can be applied.
+    """
+    errors = []
+    scheduled = set(scheduled_ids)
+    add = list(dict.fromkeys(add_ids))
+    drop = set(drop_ids)
+
+    unknown = [section_id for section_id in add if catalog.get(section_id) is None]
+    if unknown:
+        errors.append(_error('unknown_section', "Some sections do not exist.", unknown))
+
+    already = [section_id for section_id in add if section_id in scheduled and section_id not in drop]
+    if already:
+        errors.append(_error('already_scheduled', "Some sections are already in your schedule.", already))
+
+    missing = drop - scheduled
+    if missing:
+        errors.append(_error('not_scheduled', "Some sections to drop are not in your schedule.", missing))
+
+    if errors:
+        return errors
+
+    final_ids = (scheduled - drop) | set(add)
+    final = [catalog.get(section_id) for section_id in final_ids]
+    final = [section for section in final if section is not None]
+    added = set(add)
+
+    # Child sections need one of their parent lectures in the final schedule. Only
+    # sections this batch adds or whose parent it drops are checked, so problems
+    # already on the schedule don't block unrelated changes.
+    orphans = [
+        section.id for section in final
+        if section.type in CHILD_TYPES
+        and (section.id in added or any(parent.id in drop for parent in catalog.parents_of(section.id)))
+        and not any(parent.id in final_ids for parent in catalog.parents_of(section.id))
+    ]
+    if orphans:
+        errors.append(_error('missing_parent', "Some sections need their parent lecture.", orphans))
+
+    # At most one lecture and one section of each child type per course
+    slots = Counter((section.courseCode, section.type) for section in final)
+    touched = {(catalog.get(section_id).courseCode, catalog.get(section_id).type) for section_id in added}
+    for (course_code, section_type), count in slots.items():
+        if count > 1 and (course_code, section_type) in touched:
+            clashing = [
+                section.id for section in final
+                if section.courseCode == course_code and section.type == section_type
+            ]
+            if section_type == 'Lecture':
+                errors.append(_error(
+                    'duplicate_lecture', f"You can only have one lecture for {course_code}.", clashing
+                ))
+            else:
+                errors.append(_error(
+                    'duplicate_child_type', f"You can only have one {section_type} section for {course_code}.", clashing
+                ))
+
+    # One sweep finds every clash between new sections and what stays scheduled
+    conflicts = find_conflicts(
+        [(section.id, row_meeting(section)) for section in final if section.id in added],
+        [(section.id, row_meeting(section)) for section in final if section.id not in added]
+    )
+    for section_id, other_id in conflicts:
+        section, other = catalog.get(section_id), catalog.get(other_id)
+        errors.append(_error(
+            'time_conflict',
+            f"{section.courseCode} {section.type} ({section.time} {section.days}) conflicts with "
+            f"{other.courseCode} {other.type} ({other.time} {other.days}).",
+            [section_id, other_id]
+        ))
+
+    return errors
@@ -0,0 +1,176 @@
+"""Streaming iCalendar and CSV exports of schedules and the catalog.
+
+Every export is a generator of text chunks, so a response never holds more
+than one chunk in memory no matter how many rows it covers. Sections become
+one weekly recurring event each (``RRULE:FREQ=WEEKLY;BYDAY=...``) built from
+the precompiled ``startMin``/``endMin``/``dayMask`` columns; sections with
+TBA or malformed times have no event but still appear in CSV exports.
+
+Bulk exports iterate the cursor instead of fetching every row. They read
+from a read-only connection of their own, outside the request pools, so a
+slow download never ties up a pooled reader; it is closed when the stream
+finishes or the client goes away.
+"""
+import csv
+import datetime
+import sqlite3
+
+import db
+from conflicts import DAY_BITS, MINUTES_PER_DAY
+
+DEFAULT_WEEKS = 15
+MAX_WEEKS = 53
+CHUNK_SIZE = 64 * 1024  # Characters buffered before a chunk is sent
+PRODID = '-//CourseScheduler//Schedule Export//EN'
+
+ICS_DAYS = {'M': 'MO', 'T': 'TU', 'W': 'WE', 'Th': 'TH', 'F': 'FR', 'Sa': 'SA', 'Su': 'SU'}
+
+SECTION_COLUMNS = ('id', 'courseCode', 'courseName', 'instructor', 'type', 'time', 'days', 'parentID')
+SCHEDULE_COLUMNS = ('userID',) + SECTION_COLUMNS
+
+ALL_SCHEDULES_QUERY = '''
+    SELECT s.userID, c.*
+    FROM Schedule s
+    JOIN Courses c ON c.id = s.courseID
+    WHERE s.userID IS NOT NULL
+    ORDER BY s.userID, s.courseID
+'''
+
+
+def term_start(value=None, today=None):
+    """Parse a ``YYYY-MM-DD`` start date, defaulting to the Monday of this week.
+
+    Returns None if value is given but isn't a valid date.
+    """
+    if value:
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            return None
+    today = today or datetime.date.today()
+    return today - datetime.timedelta(days=today.weekday())
+
+
+def _chunked(pieces, size=CHUNK_SIZE):
+    """Join small strings into chunks of about size characters."""
+    buffer, length = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _escape(value):
+    """Escape a TEXT property value (RFC 5545 section 3.3.11)."""
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    """Fold a content line to 75 octets, continuing with a leading space."""
+    if len(line.encode('utf-8')) <= 75:
+        return line + '\r\n'
+    parts, current, octets = [], '', 0
+    for char in line:
+        width = len(char.encode('utf-8'))
+        if octets + width > 75:
+            parts.append(current)
+            current, octets = ' ', 1
+        current += char
+        octets += width
+    parts.append(current)
+    return '\r\n'.join(parts) + '\r\n'
+
+
+def _local_time(day, minutes):
+    # 24:00 can't be written as a DATE-TIME; end a minute early instead
+    minutes = min(minutes, MINUTES_PER_DAY - 1)
+    return f"{day:%Y%m%d}T{minutes // 60:02d}{minutes % 60:02d}00"
+
+
+def section_event(section, start, weeks, stamp):
+    """Return the VEVENT lines for a section's weekly meetings, or None if it has no meeting time.
+
+    section is any mapping with the catalog columns, e.g. a ``Section`` or
+    ``sqlite3.Row``. The first event falls on the first meeting day on or
+    after start and the rule repeats for weeks weeks. Times are floating
+    local times, as in the catalog.
+    """
+    mask = section['dayMask']
+    if not mask or section['startMin'] is None or section['endMin'] is None:
+        return None
+
+    # Weekday bits follow date.weekday() order: Monday is 1 << 0
+    offset = next(days for days in range(7) if mask & (1 << (start + datetime.timedelta(days=days)).weekday()))
+    first = start + datetime.timedelta(days=offset)
+    last = start + datetime.timedelta(weeks=weeks, days=-1)
+    by_day = ','.join(ICS_DAYS[day] for day, bit in DAY_BITS.items() if mask & bit)
+
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:{section['id']}-{start:%Y%m%d}@course-scheduler",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART:{_local_time(first, section['startMin'])}",
+        f"DTEND:{_local_time(first, section['endMin'])}",
+        f"RRULE:FREQ=WEEKLY;BYDAY={by_day};UNTIL={last:%Y%m%d}T235959",
+        f"SUMMARY:{_escape(section['courseCode'])} {_escape(section['type'] or '')}".rstrip(),
+        f"DESCRIPTION:{_escape(section['courseName'])}\\nSection {_escape(section['id'])}",
+    ]
+    if section['instructor']:
+        lines.append(f"X-INSTRUCTOR:{_escape(section['instructor'])}")
+    lines.append('END:VEVENT')
+    return lines
+
+
+def ics_stream(sections, start, weeks=DEFAULT_WEEKS, name='Course Schedule'):
+    """Yield an iCalendar file with one recurring event per timed section."""
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+    def lines():
+        yield 'BEGIN:VCALENDAR'
+        yield 'VERSION:2.0'
+        yield f'PRODID:{PRODID}'
+        yield 'CALSCALE:GREGORIAN'
+        yield f'X-WR-CALNAME:{_escape(name)}'
+        for section in sections:
+            event = section_event(section, start, weeks, stamp)
+            if event is not None:
+                yield from event
+        yield 'END:VCALENDAR'
+
+    return _chunked(_fold(line) for line in lines())
+
+
+class _Line:
+    """A file-like object whose write() hands back what csv.writer wrote."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows, columns):
+    """Yield a CSV file with a header row and the given columns of every row."""
+    writer = csv.writer(_Line())
+
+    def lines():
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow([row[column] for column in columns])
+
+    return _chunked(lines())
+
+
+def iter_rows(database, sql, parameters=()):
+    """Yield rows from a read-only connection opened for as long as the generator runs."""
+    # The generator may be closed from another thread than the one that iterated it
+    conn = sqlite3.connect(database, timeout=db.BUSY_TIMEOUT, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA query_only = ON')
+    try:
+        yield from conn.execute(sql, parameters)
+    finally:
+        conn.close()
@@ -0,0 +1,123 @@
+"""Full-text course search backed by the CoursesSearch FTS5 table.
+
+``dataimport.py`` fills CoursesSearch with one row per section, keyed by the
+section's ``id`` in an unindexed column. Courses has a TEXT primary key, so
+its implicit rowid may be renumbered by VACUUM and can't be shared. Course codes are indexed both split ("csci 104") and joined
+("csci104") so "csci 104", "CSCI-104", "csci104" and "104" all match.
+"""
+import re
+
+SEARCH_TABLE = 'CoursesSearch'
+
+SEARCH_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+    courseID UNINDEXED,
+    codeTokens,
+    courseName,
+    instructor,
+    tokenize = 'unicode61'
+);
+"""
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+
+# Exact-match filters search results can be narrowed by
+SEARCH_FILTERS = ('type', 'instructor', 'days')
+
+# BM25 column weights: code matches outrank name matches, which outrank instructor matches
+_BM25_WEIGHTS = (10.0, 5.0, 1.0)
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+")
+
+
+def code_tokens(course_code):
+    """Index text for a course code: its parts plus the parts joined together."""
+    parts = _TOKEN_RE.findall(course_code)
+    return " ".join(parts + ["".join(parts)]) if len(parts) > 1 else " ".join(parts)
+
+
+def fts_query(text):
+    """Turn free user input into an FTS5 prefix query, or None if it has no terms.
+
+    Each alphanumeric run becomes a quoted prefix term, so punctuation in the
+    input can never produce FTS5 syntax errors.
+    """
+    terms = _TOKEN_RE.findall(text or "")
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_page(conn, text, limit=DEFAULT_LIMIT, offset=0, **filters):
+    """Return one page of Courses rows matching the query, best BM25 rank first.
+
+    Filters are exact matches on SEARCH_FILTERS columns. Returns ``(rows,
+    next_offset)`` where ``next_offset`` is None on the last page, so
+    callers can always tell when there are more matches.
+    """
+    match = fts_query(text)
+    if match is None:
+        return [], None
+
+    limit = max(1, min(limit, MAX_LIMIT))
+    offset = max(0, offset)
+    clauses = [f'{SEARCH_TABLE} MATCH ?']
+    params = [match]
+    for column in SEARCH_FILTERS:
+        if filters.get(column):
+            clauses.append(f'c.{column} = ?')
+            params.append(filters[column])
+    rows = conn.execute(f'''
+        SELECT c.*
+        FROM {SEARCH_TABLE} s
+        JOIN Courses c ON c.id = s.courseID
+        WHERE {' AND '.join(clauses)}
+        ORDER BY bm25({SEARCH_TABLE}, {", ".join(map(str, _BM25_WEIGHTS))}), c.courseCode, c.id
+        LIMIT ? OFFSET ?
+    ''', params + [limit + 1, offset]).fetchall()
+
+    if len(rows) > limit:
+        return rows[:limit], offset + limit
+    return rows, None
+
+
+def search_sections(conn, text, limit=DEFAULT_LIMIT, offset=0, **filters):
+    """Return Courses rows matching the query, best BM25 rank first."""
+    return search_page(conn, text, limit, offset, **filters)[0]
+
+
+def search_index_current(cursor):
+    """Check whether CoursesSearch exists and is keyed by section id rather than rowid."""
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({SEARCH_TABLE})")}
+    return 'courseID' in columns
+
+
+def rebuild_search_index(cursor):
+    """Repopulate CoursesSearch from the Courses table."""
+    cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+    cursor.execute(SEARCH_SCHEMA)
+    index_search_rows(cursor, cursor.execute(
+        "SELECT id, courseCode, courseName, instructor FROM Courses"
+    ).fetchall())
+
+
+def index_search_rows(cursor, rows):
+    """Add ``(id, courseCode, courseName, instructor)`` Courses rows to the index."""
+    cursor.executemany(
+        f"INSERT INTO {SEARCH_TABLE} (courseID, codeTokens, courseName, instructor) VALUES (?, ?, ?, ?)",
+        ((course_id, code_tokens(course_code), course_name, instructor)
+         for course_id, course_code, course_name, instructor in rows)
+    )
+
+
+def delete_search_rows(cursor, course_ids):
+    """Remove the index entries for the given section ids.
+
+    courseID is unindexed, so the ids are gathered first and removed in one
+    pass over the index rather than one scan per id.
+    """
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS SearchDeletes (id TEXT PRIMARY KEY)")
+    cursor.execute("DELETE FROM temp.SearchDeletes")
+    cursor.executemany("INSERT OR IGNORE INTO temp.SearchDeletes (id) VALUES (?)", ((i,) for i in course_ids))
+    cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE courseID IN (SELECT id FROM temp.SearchDeletes)")
@@ -0,0 +1,156 @@
+"""Enumerate conflict-free schedules for a list of course codes.
+
+Each course contributes one Lecture plus one section of every child type
+(Lab, Discussion, Quiz) that hangs off that lecture through ``parentID``.
+The search backtracks over those slots, keeping the schedule's occupancy as
+a single minute-resolution bitmask so every placement is one ``&`` test.
+"""
+import time
+
+from catalog import CHILD_TYPES, get_catalog
+from conflicts import occupancy_mask, row_meeting
+
+DEFAULT_LIMIT = 100
+DEFAULT_TIMEOUT = 2.0  # Seconds
+
+# Bounds for caller-supplied limits; a search is never unbounded
+MAX_LIMIT = 1000
+MIN_TIMEOUT = 0.01
+MAX_TIMEOUT = 10.0
+
+
+class Option:
+    """A schedulable section together with its precomputed occupancy mask."""
+
+    __slots__ = ('row', 'id', 'mask')
+
+    def __init__(self, row):
+        self.row = row
+        self.id = row['id']
+        self.mask = occupancy_mask(row_meeting(row))
+
+
+def load_sections(catalog, course_codes):
+    """Fetch every section belonging to the given course codes from the catalog."""
+    return [section for code in course_codes for section in catalog.course_sections(code)]
+
+
+def build_course_options(rows, catalog):
+    """Group section rows into ``{courseCode: [(lecture, [[child, ...], ...]), ...]}``.
+
+    The inner list holds one group of candidate sections per required child
+    type, following the catalog's SectionParents links. Children that clash
+    with their own lecture are dropped up front.
+    """
+    lectures = {}
+    children = {}
+    for row in rows:
+        if row['type'] == 'Lecture':
+            lectures.setdefault(row['courseCode'], []).append(Option(row))
+        elif row['type'] in CHILD_TYPES:
+            option = Option(row)
+            for parent in catalog.parents_of(row['id']):
+                children.setdefault(parent.id, []).append(option)
+
+    options = {}
+    for course_code, course_lectures in lectures.items():
+        bundles = []
+        for lecture in course_lectures:
+            groups = {}
+            for child in children.get(lecture.id, []):
+                groups.setdefault(child.row['type'], []).append(child)
+            fitting = [
+                [child for child in group if not child.mask & lecture.mask]
+                for _, group in sorted(groups.items())
+            ]
+            if all(fitting):
+                # Most constrained child type first
+                bundles.append((lecture, sorted(fitting, key=len)))
+        options[course_code] = bundles
+    return options
+
+
+class ScheduleSolver:
+    """Lazily enumerate conflict-free schedules, stopping at a cap or timeout."""
+
+    def __init__(self, course_options, limit=DEFAULT_LIMIT, timeout=DEFAULT_TIMEOUT, occupied=0):
+        # Most constrained course first keeps the search tree narrow
+        self.courses = sorted(course_options.items(), key=lambda item: len(item[1]))
+        self.limit = limit
+        self.timeout = timeout
+        self.occupied = occupied  # Occupancy of sections that stay fixed, e.g. the rest of a schedule
+        self.timed_out = False
+        self.truncated = False
+        self.found = 0
+        self._deadline = None
+        self._nodes = 0
+
+    def __iter__(self):
+        return self.solve()
+
+    def solve(self):
+        """Yield each valid schedule as a list of section rows."""
+        self._deadline = time.monotonic() + self.timeout if self.timeout else None
+        if any(not bundles for _, bundles in self.courses):
+            return
+        for schedule in self._place_course(0, self.occupied, []):
+            if self.limit and self.found >= self.limit:
+                # Only a solution past the cap means results were actually cut off
+                self.truncated = True
+                return
+            self.found += 1
+            yield [option.row for option in schedule]
+
+    def _out_of_time(self):
+        # Checking the clock on every node would dominate the search cost
+        self._nodes += 1
+        if self._deadline is not None and not self._nodes & 0x3FF:
+            if time.monotonic() > self._deadline:
+                self.timed_out = True
+        return self.timed_out
+
+    def _place_course(self, index, occupied, chosen):
+        if index == len(self.courses):
+            yield list(chosen)
+            return
+
+        for lecture, child_groups in self.courses[index][1]:
+            if lecture.mask & occupied:
+                continue
+            if self._out_of_time():
+                return
+            chosen.append(lecture)
+            yield from self._place_children(index, child_groups, 0, occupied | lecture.mask, chosen)
+            chosen.pop()
+            if self.timed_out:
+                return
+
+    def _place_children(self, index, child_groups, group_index, occupied, chosen):
+        if group_index == len(child_groups):
+            yield from self._place_course(index + 1, occupied, chosen)
+            return
+
+        for child in child_groups[group_index]:
+            if child.mask & occupied:
+                continue
+            if self._out_of_time():
+                return
+            chosen.append(child)
+            yield from self._place_children(index, child_groups, group_index + 1, occupied | child.mask, chosen)
+            chosen.pop()
+            if self.timed_out:
+                return
+
+
+def generate_schedules(conn, course_codes, limit=DEFAULT_LIMIT, timeout=DEFAULT_TIMEOUT):
+    """Build a solver for the given course codes. Iterate it to get schedules.
+
+    Raises ValueError listing any course codes that have no lecture sections.
+    """
+    course_codes = list(dict.fromkeys(course_codes))
+    catalog = get_catalog(conn)
+    course_options = build_course_options(load_sections(catalog, course_codes), catalog)
+    unknown = [code for code in course_codes if code not in course_options]
+    if unknown:
+        raise ValueError(f"No lecture sections found for: {', '.join(unknown)}")
+    return ScheduleSolver(course_options, limit=limit, timeout=timeout)
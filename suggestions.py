@@ -0,0 +1,121 @@
+"""Suggest the fewest section swaps that let a conflicting section fit.
+
+When a new section clashes with the schedule, alternate sections of its own
+course are tried first, then alternates for one scheduled course, then two,
+and so on, re-picking each moved course's Lab/Discussion/Quiz children too.
+Only scheduled courses that clash with some option of the new course are
+considered for moving, and the whole search shares one deadline, so the
+answer stays within a request's latency budget.
+"""
+import time
+from itertools import combinations
+
+from solver import Option, ScheduleSolver, build_course_options
+
+MAX_MOVES = 3
+SUGGESTION_TIMEOUT = 0.25  # Seconds for the whole search
+
+# Key for the new course in the solver's course options, distinct from any courseCode
+_NEW = object()
+
+
+def _new_course_options(catalog, section, scheduled_ids):
+    """Bundles for the course being added, the user's own pick first."""
+    if section.type == 'Lecture':
+        bundles = build_course_options(catalog.course_sections(section.courseCode), catalog).get(section.courseCode, [])
+        return sorted(bundles, key=lambda bundle: bundle[0].id != section.id)
+
+    # A child section: its siblings of the same type under a scheduled lecture
+    siblings = [
+        child
+        for parent in catalog.parents_of(section.id) if parent.id in scheduled_ids
+        for child in catalog.children_of(parent.id) if child.type == section.type
+    ]
+    siblings = sorted(dict.fromkeys(siblings), key=lambda child: child.id != section.id)
+    return [(Option(child), []) for child in siblings]
+
+
+def suggest_swaps(catalog, scheduled_ids, section_id, max_moves=MAX_MOVES, timeout=SUGGESTION_TIMEOUT):
+    """Find the smallest set of changes that fits section_id's course into the schedule.
+
+    Returns a dict with ``add`` (the sections to add for the new course)
+    and ``swaps`` (one ``{'courseCode', 'drop', 'add'}`` entry per scheduled
+    course that has to move), or None if nothing was found in time.
+    """
+    section = catalog.get(section_id)
+    if section is None:
+        return None
+    deadline = time.monotonic() + timeout
+
+    new_options = _new_course_options(catalog, section, scheduled_ids)
+    if not new_options:
+        return None
+
+    # Every scheduled section grouped by course. The new section is added
+    # alongside them, so its own course's lecture and children stay fixed too.
+    fixed = {}
+    for scheduled_id in scheduled_ids:
+        scheduled = catalog.get(scheduled_id)
+        if scheduled is not None:
+            fixed.setdefault(scheduled.courseCode, []).append(Option(scheduled))
+    course_masks = {code: _union(option.mask for option in options) for code, options in fixed.items()}
+
+    # Only courses that clash with some option of the new course are worth moving
+    reach = _union(
+        lecture.mask | _union(child.mask for group in groups for child in group)
+        for lecture, groups in new_options
+    )
+    movable = [
+        code for code, mask in course_masks.items()
+        if mask & reach and (section.type == 'Lecture' or code != section.courseCode)
+    ]
+
+    for moves in range(min(max_moves, len(movable)) + 1):
+        for moved in combinations(movable, moves):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+
+            occupied = _union(mask for code, mask in course_masks.items() if code not in moved)
+            course_options = {_NEW: new_options}
+            if moved:
+                course_options.update(build_course_options(
+                    [s for code in moved for s in catalog.course_sections(code)], catalog
+                ))
+            solver = ScheduleSolver(course_options, limit=1, timeout=remaining, occupied=occupied)
+            for schedule in solver:
+                return _describe(catalog, schedule, new_options, fixed, moved)
+            if solver.timed_out:
+                return None
+    return None
+
+
+def _union(masks):
+    occupancy = 0
+    for mask in masks:
+        occupancy |= mask
+    return occupancy
+
+
+def _describe(catalog, schedule, new_options, fixed, moved):
+    new_ids = {lecture.id for lecture, _ in new_options}
+    new_ids |= {child.id for _, groups in new_options for group in groups for child in group}
+
+    suggestion = {'add': [], 'swaps': []}
+    picked = {}
+    for row in schedule:
+        if row['id'] in new_ids:
+            suggestion['add'].append(catalog.get(row['id']))
+        else:
+            picked.setdefault(row['courseCode'], []).append(catalog.get(row['id']))
+
+    for code in moved:
+        current = {option.id for option in fixed[code]}
+        chosen = {section.id for section in picked.get(code, [])}
+        if current != chosen:
+            suggestion['swaps'].append({
+                'courseCode': code,
+                'drop': [catalog.get(section_id) for section_id in sorted(current - chosen)],
+                'add': [catalog.get(section_id) for section_id in sorted(chosen - current)],
+            })
+    return suggestion
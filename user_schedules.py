@@ -0,0 +1,154 @@
+"""Per-user schedules and their cached occupancy.
+
+Every Schedule row belongs to a userID (an anonymous session id for now),
+and ``(userID, courseID)`` is indexed so a user's schedule is one index
+range scan. ScheduleUsers keeps a per-user version that every write bumps
+in the same transaction, together with a lastSeen stamp. Readers check
+that version with a single primary-key lookup and otherwise reuse a cached
+``UserSchedule``: the scheduled sections, their ids and their merged
+weekly occupancy mask, so conflict checks never join Schedule to Courses.
+
+Abandoned anonymous sessions are expired in bulk by ``expire_sessions``,
+e.g. from a cron job running ``python user_schedules.py --expire-days 30``.
+"""
+import argparse
+import sqlite3
+import time
+from collections import namedtuple
+
+from cache import LRUCache
+from conflicts import occupancy_mask, row_meeting
+
+DATABASE = "courses.db"
+CACHE_SIZE = 10000  # Users whose schedules stay cached per process
+SESSION_MAX_AGE = 30 * 24 * 60 * 60  # Seconds without changes before an anonymous schedule expires
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS Schedule (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        courseID INTEGER,
+        userID TEXT,
+        FOREIGN KEY (courseID) REFERENCES Courses (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ScheduleUsers (
+        userID TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        lastSeen INTEGER NOT NULL,
+        anonymous INTEGER NOT NULL DEFAULT 1
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_schedule_user_course ON Schedule (userID, courseID)",
+    "CREATE INDEX IF NOT EXISTS idx_schedule_users_expiry ON ScheduleUsers (anonymous, lastSeen)",
+)
+
+
+class UserSchedule(namedtuple('UserSchedule', ('version', 'sections', 'ids', 'mask'))):
+    """A user's scheduled catalog sections, their ids and merged occupancy mask."""
+
+    __slots__ = ()
+
+    def conflicts_with(self, section):
+        """Check whether a section overlaps anything on the schedule."""
+        return bool(occupancy_mask(row_meeting(section)) & self.mask)
+
+
+_cache = LRUCache(CACHE_SIZE)
+
+
+def ensure_schema(conn):
+    """Create the schedule tables, adding userID to a Schedule table that predates it."""
+    conn.execute(SCHEMA[0])
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(Schedule)')}
+    if 'userID' not in columns:
+        # Rows from before per-user schedules keep a NULL owner and are never shown
+        conn.execute('ALTER TABLE Schedule ADD COLUMN userID TEXT')
+    for statement in SCHEMA[1:]:
+        conn.execute(statement)
+
+
+def schedule_version(conn, user_id):
+    """Return the user's schedule version, 0 if they have never changed it."""
+    row = conn.execute('SELECT version FROM ScheduleUsers WHERE userID = ?', (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def touch_user(conn, user_id):
+    """Record a change to the user's schedule; call it inside the writing transaction.
+
+    Versions start from the clock rather than 1, so a user whose row was
+    expired and recreated never reuses a version another process has cached.
+    """
+    now = time.time_ns()
+    conn.execute('''
+        INSERT INTO ScheduleUsers (userID, version, lastSeen) VALUES (?, ?, ?)
+        ON CONFLICT (userID) DO UPDATE SET
+            version = MAX(version + 1, excluded.version),
+            lastSeen = excluded.lastSeen
+    ''', (user_id, now, now // 1_000_000_000))
+
+
+def scheduled_section_ids(conn, user_id):
+    """Read the section ids on the user's schedule straight from the database."""
+    return {
+        row[0] for row in conn.execute(
+            'SELECT courseID FROM Schedule WHERE userID = ? AND courseID IS NOT NULL', (user_id,)
+        )
+    }
+
+
+def get_user_schedule(conn, catalog, user_id):
+    """Return the user's cached ``UserSchedule``, reloading it if it changed since."""
+    version = schedule_version(conn, user_id)
+    key = (conn.execute('PRAGMA database_list').fetchone()[2], catalog.version, user_id)
+    cached = _cache.get(key)
+    if cached is not None and cached.version == version:
+        return cached
+
+    rows = conn.execute(
+        'SELECT courseID FROM Schedule WHERE userID = ? AND courseID IS NOT NULL ORDER BY id', (user_id,)
+    )
+    sections = tuple(
+        section for section in (catalog.get(row[0]) for row in rows) if section is not None
+    )
+    mask = 0
+    for section in sections:
+        mask |= occupancy_mask(row_meeting(section))
+
+    schedule = UserSchedule(version, sections, frozenset(section.id for section in sections), mask)
+    _cache.put(key, schedule)
+    return schedule
+
+
+def expire_sessions(conn, max_age=SESSION_MAX_AGE):
+    """Delete every anonymous schedule left unchanged for max_age seconds.
+
+    Returns the number of users removed.
+    """
+    cutoff = int(time.time()) - max_age
+    conn.execute('''
+        DELETE FROM Schedule
+        WHERE userID IN (SELECT userID FROM ScheduleUsers WHERE anonymous = 1 AND lastSeen < ?)
+    ''', (cutoff,))
+    expired = conn.execute(
+        'DELETE FROM ScheduleUsers WHERE anonymous = 1 AND lastSeen < ?', (cutoff,)
+    ).rowcount
+    conn.commit()
+    return expired
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the schedule tables and expire abandoned sessions.")
+    parser.add_argument("--expire-days", type=float, default=SESSION_MAX_AGE / 86400,
+                        help="Expire anonymous schedules unchanged for this many days.")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(DATABASE)
+    try:
+        ensure_schema(conn)
+        expired = expire_sessions(conn, max_age=int(args.expire_days * 86400))
+        print(f"Expired {expired} abandoned schedules.")
+    finally:
+        conn.close()